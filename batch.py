@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+
+import main
+from boiler import Boiler
+from radiator import RadiateurFleet
+
+# -------------------------------------------------------------------------
+# Manifeste JSON : une liste de bâtiments (les chemins des CSV sont relatifs au manifeste)
+# [
+#   {
+#     "nom": "Ecole",
+#     "lat": 50.85, "long": 4.35, "altitude": 66,
+#     "chaudiere": {"puissance_nominale": 60, "puissance_min": 10, "t_ext_base": -9, "t_ext_non_chauffage": 19,
+#                   "t_max_chaudiere": 60, "t_min_chaudiere": 24, "nombre": 2},
+#     "radiateurs": [{"fichier": "data/radiateur_bat_principal.csv", "regime": [60, 40]}],
+#     "facades": [{"azimuth": 115, "surface_vitrage": 153.5}, {"azimuth": 205, "surface_vitrage": 25}],
+#     "facteur_solaire": 0.37, "angle_condition": 10, "rho": 0.15,
+#     "temperature": 5.0, "nuages": 40          <- optionnels, sinon observation OpenWeatherMap
+#   }
+# ]
+# -------------------------------------------------------------------------
+
+
+# -------- BATIMENT DECRIT PAR LES CONSTANTES DE main.py (MEME FORMAT QU'UNE ENTREE DU MANIFESTE) --------
+def building_from_constants():
+    return {"nom": None,
+            "lat": main.LAT,
+            "long": main.LONG,
+            "altitude": main.ALTITUDE,
+            "chaudiere": {"puissance_nominale": main.PUISSANCE_NOMINALE,
+                          "puissance_min": main.PUISSANCE_MIN,
+                          "t_ext_base": main.T_EXT_BASE,
+                          "t_ext_non_chauffage": main.T_EXT_NON_CHAUFFAGE,
+                          "t_max_chaudiere": main.T_MAX_CHAUDIERE,
+                          "t_min_chaudiere": main.T_MIN_CHAUDIERE,
+                          "nombre": main.NOMBRE},
+            "radiateurs": [{"fichier": f"data/{fichier}.csv", "regime": list(regime)}
+                           for fichier, regime in zip(main.FICHIERS, main.REGIME_DIM)],
+            "facades": [{"azimuth": azimuth, "surface_vitrage": surface}
+                        for azimuth, surface in zip(main.BAT_AZIMUTH, main.SURFACE_VITRAGE)],
+            "facteur_solaire": main.FACTEUR_SOLAIRE,
+            "angle_condition": main.ANGLE_CONDITION,
+            "rho": main.RHO}
+
+
+# -------- LECTURE DU MANIFESTE --------
+def load_manifest(manifest_path):
+    with open(manifest_path, encoding="utf-8") as f:
+        buildings = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for building in buildings:
+        for radiateur in building["radiateurs"]:
+            radiateur["fichier"] = os.path.join(base_dir, radiateur["fichier"])
+    return buildings
+
+
+# -------- BATIMENT DU MANIFESTE CHOISI PAR SON NOM (DEFAUT : LE PREMIER) --------
+def select_building(buildings, nom=None):
+    if not buildings:
+        raise ValueError("Manifeste vide : aucun bâtiment")
+    if nom is None:
+        return buildings[0]
+    for building in buildings:
+        if building.get("nom") == nom:
+            return building
+    raise ValueError(f"Bâtiment '{nom}' absent du manifeste (disponibles : {[b.get('nom') for b in buildings]})")
+
+
+# -------- PARAMETRES SOLAIRES D'UN BATIMENT (ARGUMENTS DE main.solar_management ET solar_management_series) --------
+def solar_kwargs(building):
+    return {"lat": building["lat"],
+            "long": building["long"],
+            "altitude": building.get("altitude", 0),
+            "bat_azimuth": [facade["azimuth"] for facade in building["facades"]],
+            "surface_vitrage": [facade["surface_vitrage"] for facade in building["facades"]],
+            "facteur_solaire": building.get("facteur_solaire", main.FACTEUR_SOLAIRE),
+            "rho": building.get("rho", main.RHO),
+            "angle_condition": building.get("angle_condition", main.ANGLE_CONDITION)}
+
+
+# -------- CHAUDIERE D'UN BATIMENT, LOIS D'EAU CALCULEES (pente_temp_eau, depla_parallele) --------
+def boiler_from_building(building):
+    chaudiere = building["chaudiere"]
+    boiler = Boiler(puissance_nom=chaudiere["puissance_nominale"], puissance_min=chaudiere["puissance_min"],
+                    t_ext_base=chaudiere["t_ext_base"], t_ext_non_chauffage=chaudiere["t_ext_non_chauffage"],
+                    t_min_chaudiere=chaudiere["t_min_chaudiere"], t_max_chaudiere=chaudiere["t_max_chaudiere"])
+    boiler.loi_eau_t_depart_text()
+    boiler.loi_eau_t_ext_puissance()
+    return boiler
+
+
+# -------- ESTIMATION D'UN BATIMENT (EXECUTEE DANS UN PROCESSUS DU POOL) --------
+def estimate_building(building, today=None):
+    today = today if today is not None else dt.now()
+    resultat = {"nom": building.get("nom"), "lat": building["lat"], "long": building["long"], "date": today.isoformat()}
+    try:
+        if "temperature" in building and "nuages" in building:
+            nuages, temperature = building["nuages"], building["temperature"]
+        else:
+            nuages, temperature = main.fetch_weather_conditions(lat=building["lat"], long=building["long"])
+        chaudiere = building["chaudiere"]
+        t_depart, puissance_chaudiere, pente, deplacement = main.boiler_management(
+            p_nom=chaudiere["puissance_nominale"],
+            p_min=chaudiere["puissance_min"],
+            t_ext_b=chaudiere["t_ext_base"],
+            t_ext_non_ch=chaudiere["t_ext_non_chauffage"],
+            t_max_chaud=chaudiere["t_max_chaudiere"],
+            t_min_chaud=chaudiere["t_min_chaudiere"],
+            temp=temperature,
+            num=chaudiere.get("nombre", 1))
+        puissance_radiateurs = 0
+        for radiateur in building["radiateurs"]:
+            t_entree_dim, t_sortie_dim = radiateur["regime"]
+            radiateurs = RadiateurFleet.from_csv(radiateur["fichier"], t_entree_dim=t_entree_dim, t_sortie_dim=t_sortie_dim)
+            puissance_radiateurs += float(radiateurs.puissance_totale(t_entree=t_depart))
+        apports, azimuth, elevation, dni, dhi, ghi, dni_corrige = main.solar_management(
+            cloud=nuages, today=today, **solar_kwargs(building))
+    except Exception as e:
+        # Un bâtiment en erreur ne doit pas interrompre le lot : l'erreur est reportée dans le tableau
+        resultat["erreur"] = f"{type(e).__name__}: {str(e)}"
+        return resultat
+    resultat.update({"temperature": temperature,
+                     "nuages": nuages,
+                     "t_depart": t_depart,
+                     "pente": pente,
+                     "deplacement": deplacement,
+                     "puissance_chaudiere": puissance_chaudiere,
+                     "puissance_radiateurs": puissance_radiateurs,
+                     "apports_solaires": apports,
+                     "solar_azimuth": azimuth,
+                     "solar_elevation": elevation,
+                     "puissance_totale": puissance_radiateurs + apports})
+    return resultat
+
+
+# -------- LOT COMPLET REPARTI SUR TOUS LES COEURS --------
+def run_manifest(manifest_path, output_path, processes=None, today=None):
+    import pandas as pd
+
+    buildings = load_manifest(manifest_path)
+    today = today if today is not None else dt.now()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        resultats = list(pool.map(estimate_building, buildings, [today] * len(buildings)))
+    df_resultats = pd.DataFrame(resultats)
+    if output_path.endswith(".parquet"):
+        df_resultats.to_parquet(output_path, index=False)
+    else:
+        df_resultats.to_csv(output_path, sep=";", index=False)
+    return df_resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("manifest", help="Manifeste JSON des bâtiments")
+    parser.add_argument("-o", "--output", default="resultats.csv", help="Tableau consolidé (.csv ou .parquet)")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="Nombre de processus (défaut : tous les coeurs)")
+    parser.add_argument("--date", type=dt.fromisoformat, default=None, help="Date d'estimation (ISO), défaut : maintenant")
+    args = parser.parse_args()
+    df = run_manifest(args.manifest, args.output, processes=args.processes, today=args.date)
+    print(f"{len(df)} bâtiment(s) estimé(s) -> {args.output}")
@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import main
+from inventory import CACHE_DIR, load_inventory
+from solar_cache import SOLAR_CACHE
+
+# Fixtures locales : aucune requête réseau, site et observation météo fixes
+LAT = 50.85
+LONG = 4.35
+TEMPERATURE = 5.0
+NUAGES = 40
+DATE = pd.Timestamp("2024-03-21 12:00")
+
+RADIATEURS = [10, 100, 1_000, 10_000, 100_000]
+FACADES = [1, 5, 10, 50]
+HORIZONS = [1, 24, 8760, 35040]  # Un instant, un jour, une année horaire, une année au quart d'heure
+QUICK = {"radiateurs": [10, 1_000], "facades": [1, 10], "horizons": [1, 24, 8760]}
+
+
+# -------- INVENTAIRE DE RADIATEURS SYNTHETIQUE (MEME FORMAT QUE data/*.csv) --------
+def write_synthetic_radiators(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    puissance = rng.integers(500, 6500, rows)
+    pd.DataFrame({"Concat": [f"rad-{i}" for i in range(rows)],
+                  "Puissance [W]": puissance,
+                  "Longueur [mm]": rng.integers(400, 2400, rows),
+                  "Hauteur [mm]": 900,
+                  "Type": 33,
+                  "Etage": rng.integers(0, 5, rows),
+                  "Classe": [f"{i // 2}" for i in range(rows)],
+                  "Local": "Classe",
+                  "Consigne": rng.choice([16, 19, 21, 24], rows),
+                  "Index": np.arange(1, rows + 1)}).to_csv(path, sep=";", index=False)
+
+
+def synthetic_facades(count):
+    return list(np.linspace(0, 360, count, endpoint=False) + 15), [20.0] * count
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+# -------- MESURE : MEILLEUR TEMPS SUR N REPETITIONS + PIC MEMOIRE (TRACEMALLOC) SUR UNE EXECUTION --------
+def measure(function, items, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    seconds = min(durations)
+    return {"seconds": seconds, "items": items, "throughput": items / seconds, "peak_mib": peak / 2 ** 20}
+
+
+# -------- CAS DE MESURE PAR ETAPE --------
+def cases(radiateurs, facades, horizons, dossier):
+    def boiler(temperatures):
+        return lambda: main.boiler_management(p_nom=main.PUISSANCE_NOMINALE, p_min=main.PUISSANCE_MIN,
+                                              t_ext_b=main.T_EXT_BASE, t_ext_non_ch=main.T_EXT_NON_CHAUFFAGE,
+                                              t_max_chaud=main.T_MAX_CHAUDIERE, t_min_chaud=main.T_MIN_CHAUDIERE,
+                                              temp=temperatures, num=main.NOMBRE)
+
+    for horizon in horizons:
+        temperatures = TEMPERATURE if horizon == 1 else np.linspace(-12, 22, horizon)
+        yield f"boiler_management[instants={horizon}]", boiler(temperatures), horizon
+
+    def radiator(rows, froid):
+        def run():
+            if froid:
+                shutil.rmtree(os.path.join(dossier, "data", CACHE_DIR), ignore_errors=True)
+            main.radiator_management(fichier_rad=f"bench_{rows}", t_entree_dim=60, t_sortie_dim=40, t_entree=45.0)
+        return run
+
+    for rows in radiateurs:
+        chemin = os.path.join(dossier, "data", f"bench_{rows}.csv")
+        write_synthetic_radiators(chemin, rows)
+        # A froid : lecture et validation du CSV puis écriture du cache (premier lancement, inventaire modifié)
+        yield f"radiator_management[radiateurs={rows},cache=froid]", radiator(rows, froid=True), rows
+        load_inventory(chemin)  # A chaud : colonnes du cache .inventaire projetées en mémoire (cas courant)
+        yield f"radiator_management[radiateurs={rows}]", radiator(rows, froid=False), rows
+
+    for count in facades:
+        azimuths, surfaces = synthetic_facades(count)
+
+        def solar(azimuths=azimuths, surfaces=surfaces):
+            SOLAR_CACHE.clear()  # Chaque tick porte sur un nouvel instant : mesure à froid
+            main.solar_management(cloud=NUAGES, lat=LAT, long=LONG, today=DATE.to_pydatetime(), bat_azimuth=azimuths,
+                                  surface_vitrage=surfaces)
+        yield f"solar_management[facades={count}]", solar, count
+
+    for horizon in horizons:
+        if horizon == 1:
+            continue
+        times = pd.date_range(DATE.normalize(), periods=horizon, freq="15min" if horizon > 8760 else "1h")
+        nuages = np.full(horizon, NUAGES)
+        for count in facades:
+            azimuths, surfaces = synthetic_facades(count)
+            yield (f"solar_management_series[instants={horizon},facades={count}]",
+                   lambda times=times, nuages=nuages, azimuths=azimuths, surfaces=surfaces:
+                   main.solar_management_series(times=times, cloud=nuages, lat=LAT, long=LONG, bat_azimuth=azimuths,
+                                                surface_vitrage=surfaces),
+                   horizon * count)
+
+
+# -------- COMPARAISON AVEC UNE REFERENCE ENREGISTREE --------
+def compare(resultats, baseline, tolerance):
+    regressions = []
+    for name, mesure in resultats.items():
+        if name not in baseline:
+            continue
+        ratio = mesure["seconds"] / baseline[name]["seconds"]
+        mesure["ratio"] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def run(radiateurs=RADIATEURS, facades=FACADES, horizons=HORIZONS, repeat=3):
+    resultats = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        os.makedirs(os.path.join(dossier, "data"))
+        with working_directory(dossier):
+            for name, function, items in cases(radiateurs, facades, horizons, dossier):
+                resultats[name] = measure(function, items, repeat)
+                mesure = resultats[name]
+                print(f"{name:<60} {mesure['seconds'] * 1000:>10.2f} ms {mesure['throughput']:>14.0f} /s "
+                      f"{mesure['peak_mib']:>9.2f} MiB", flush=True)
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="Jeu de cas réduit")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de répétitions (meilleur temps retenu)")
+    parser.add_argument("--baseline", default=None, help="Référence JSON à comparer")
+    parser.add_argument("--save-baseline", default=None, help="Enregistre les mesures comme nouvelle référence JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Ralentissement toléré avant régression (0.25 = +25%%)")
+    args = parser.parse_args()
+
+    parametres = QUICK if args.quick else {"radiateurs": RADIATEURS, "facades": FACADES, "horizons": HORIZONS}
+    resultats = run(repeat=args.repeat, **parametres)
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(resultats, f, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(resultats, json.load(f), args.tolerance)
+        for name in regressions:
+            print(f"REGRESSION {name} : x{resultats[name]['ratio']:.2f} par rapport à la référence")
+        sys.exit(1 if regressions else 0)
@@ -1,4 +1,5 @@
-import matplotlib.pyplot as plt
+import os
+
 import numpy as np
 
 
@@ -47,8 +48,12 @@ class Boiler:
         self.ordonnee_puissance = b_puissance
         self.y_temp_pui = pente_p * self.x + b_puissance  # équation b)
 
-    def tracer_graphique(self):  # Créer une figure 3D
-        fig = plt.figure(figsize=(14, 7), dpi=100)
+    # Rapport graphique optionnel : matplotlib n'est importé qu'ici, les figures ne passent pas par pyplot
+    # (aucun état global) et sont libérées à la fin de la méthode
+    def tracer_graphique(self, dossier="figures"):  # Créer une figure 3D
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(14, 7), dpi=100)
         ax = fig.add_subplot(111, projection='3d')
         # Tracer le graphique 3D
         ax.plot(self.x, self.y_temp_eau, self.y_temp_pui, label='Évolution de la puissance avec la température de l\'eau', color="crimson")
@@ -58,46 +63,52 @@ class Boiler:
         ax.set_zlabel('Puissance')
         ax.invert_xaxis()
         ax.set_title('Évolution de la puissance et de la température de l\'eau en fonction de la température extérieure')
-        plt.tight_layout()
-        fig.savefig("figures/3D_Chaudiere")
-
-        fig2 = plt.figure(2, figsize=(14, 7), dpi=100)
-        plt.plot(self.x, self.y_temp_eau, label='Relation linéaire', color="crimson")
-        plt.xlabel('Température extérieure (°C)')
-        plt.gca().invert_xaxis()
-        plt.ylabel('Température de l\'eau (°C)')
-        plt.title('Relation entre température extérieure et température de départ de l\'eau')
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
-        plt.xticks(np.arange(self.t_ext_base, self.t_ext_non_chauffage + 1, 1))
-        plt.yticks(np.arange(20, self.t_max_chaudiere + 1, 5))
-        fig2.savefig("figures/Relation_Text_Tdépart")
-
-        fig3 = plt.figure(3, figsize=(14, 7), dpi=100)
-        plt.plot(self.x, self.y_temp_pui, label='Relation linéaire', color="crimson")
-        plt.xlabel('Température extérieure (°C)')
-        plt.gca().invert_xaxis()
-        plt.ylabel('Puissance [kW]')
-        plt.title('Relation entre température extérieure et Puissance')
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
-        plt.xticks(np.arange(self.t_ext_base, self.t_ext_non_chauffage + 1, 1))
-        plt.yticks(np.arange(10, 65 + 1, 5))
-        fig3.savefig("figures/Relation_Text_Puissance")
-
-        fig4 = plt.figure(4, figsize=(14, 7), dpi=100)
-        plt.plot(self.y_temp_eau, self.y_temp_pui, label='Relation linéaire', color="crimson")
-        plt.xlabel('Température de départ (°C)')
-        plt.ylabel('Puissance [kW]')
-        plt.title('Relation entre température de départ et Puissance')
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
-        plt.xticks(np.arange(20, self.t_max_chaudiere + 1, 5))
-        plt.yticks(np.arange(10, 65 + 1, 5))
-        fig4.savefig("figures/Relation_Tdepart_Puissance")
+        fig.tight_layout()
+        fig.savefig(os.path.join(dossier, "3D_Chaudiere"))
+
+        fig2 = Figure(figsize=(14, 7), dpi=100)
+        ax2 = fig2.add_subplot()
+        ax2.plot(self.x, self.y_temp_eau, label='Relation linéaire', color="crimson")
+        ax2.set_xlabel('Température extérieure (°C)')
+        ax2.invert_xaxis()
+        ax2.set_ylabel('Température de l\'eau (°C)')
+        ax2.set_title('Relation entre température extérieure et température de départ de l\'eau')
+        ax2.legend()
+        ax2.grid(True)
+        fig2.tight_layout()
+        ax2.set_xticks(np.arange(self.t_ext_base, self.t_ext_non_chauffage + 1, 1))
+        ax2.set_yticks(np.arange(20, self.t_max_chaudiere + 1, 5))
+        fig2.savefig(os.path.join(dossier, "Relation_Text_Tdépart"))
+
+        fig3 = Figure(figsize=(14, 7), dpi=100)
+        ax3 = fig3.add_subplot()
+        ax3.plot(self.x, self.y_temp_pui, label='Relation linéaire', color="crimson")
+        ax3.set_xlabel('Température extérieure (°C)')
+        ax3.invert_xaxis()
+        ax3.set_ylabel('Puissance [kW]')
+        ax3.set_title('Relation entre température extérieure et Puissance')
+        ax3.legend()
+        ax3.grid(True)
+        fig3.tight_layout()
+        ax3.set_xticks(np.arange(self.t_ext_base, self.t_ext_non_chauffage + 1, 1))
+        ax3.set_yticks(np.arange(10, 65 + 1, 5))
+        fig3.savefig(os.path.join(dossier, "Relation_Text_Puissance"))
+
+        fig4 = Figure(figsize=(14, 7), dpi=100)
+        ax4 = fig4.add_subplot()
+        ax4.plot(self.y_temp_eau, self.y_temp_pui, label='Relation linéaire', color="crimson")
+        ax4.set_xlabel('Température de départ (°C)')
+        ax4.set_ylabel('Puissance [kW]')
+        ax4.set_title('Relation entre température de départ et Puissance')
+        ax4.legend()
+        ax4.grid(True)
+        fig4.tight_layout()
+        ax4.set_xticks(np.arange(20, self.t_max_chaudiere + 1, 5))
+        ax4.set_yticks(np.arange(10, 65 + 1, 5))
+        fig4.savefig(os.path.join(dossier, "Relation_Tdepart_Puissance"))
+
+        for figure in (fig, fig2, fig3, fig4):
+            figure.clear()
 
     def calculer_puissance(self, temperature_depart_eau):
         puissance_calculee = self.pente_puissance * ((-self.ordonnee_temp + temperature_depart_eau) / -self.pente_temp_eau) + self.ordonnee_puissance  # trouvée à partir d'une résolution du système d'équation a) et b)
@@ -112,3 +123,20 @@ class Boiler:
         else:
             result = temp_depart
         return result
+
+    # Versions vectorisées : une série complète de températures extérieures en un seul appel NumPy
+    def calculer_t_depart_serie(self, temperatures_ext):
+        temp_depart = -self.pente_temp_eau * np.asarray(temperatures_ext, dtype=float) + self.ordonnee_temp
+        return np.clip(temp_depart, self.t_min_chaudiere, self.t_max_chaudiere)
+
+    def calculer_puissance_serie(self, temperatures_depart_eau, nombre=1):
+        return self.calculer_puissance(temperature_depart_eau=np.asarray(temperatures_depart_eau, dtype=float)) * nombre
+
+    # Inverses de la loi d'eau (hors écrêtage t_min / t_max chaudière)
+    # t_depart = pivot_t_min + pente * (pivot_t_ext - t_ext) + déplacement parallèle
+    def calculer_t_ext(self, temperature_depart_eau):
+        return (np.asarray(temperature_depart_eau, dtype=float) - self.ordonnee_temp) / -self.pente_temp_eau
+
+    def calculer_deplacement(self, temperature_ext, temperature_depart_eau):
+        return (np.asarray(temperature_depart_eau, dtype=float) - self.pivot_t_min
+                - self.pente_temp_eau * (self.pivot_t_ext - np.asarray(temperature_ext, dtype=float)))
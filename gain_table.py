@@ -0,0 +1,180 @@
+import argparse
+import json
+import math
+
+import numpy as np
+
+from solar import get_irr_vertical_surfaces, irradiance_trigo_array
+
+
+# -------------------------------------------------------------------------
+# Table des apports solaires d'un bâtiment sur une grille (mois, élévation, azimut du soleil)
+# Les deux modèles (pvlib isotrope et trigo) sont linéaires en DNI, DHI et GHI : l'apport se décompose en
+#   apport(az, el, nuages) = (direct_pvlib(az, el) + direct_trigo(az, el) * [el > angle_condition])
+#                            * exp(-3 * nuages / 100) + diffus(az, el)
+# avec l'irradiance ciel clair (Ineichen) calculée à chaque élévation, pour la turbidité de Linke et l'irradiance
+# extraterrestre de chaque mois. La composante directe trigo est tabulée sans la condition d'élévation, appliquée
+# exactement à la requête : l'interpolation ne traverse pas la marche en angle_condition.
+# Comme solar_management_series, pvlib et le ciel clair utilisent l'élévation apparente (réfraction, même formule
+# que pvlib), la formule trigo l'élévation vraie. La couverture nuageuse est exacte, l'élévation et l'azimut sont
+# interpolés.
+# -------------------------------------------------------------------------
+ELEVATION_MIN = -1.0  # Soleil vrai sous l'horizon mais apparent au-dessus (réfraction)
+TEMPERATURE_AIR = 12  # Température et réfraction par défaut de pvlib.solarposition.get_solarposition
+ATMOS_REFRACT = 0.5667
+
+
+def check_pas_azimuth(pas_azimuth):
+    if not math.isclose(360 / pas_azimuth, round(360 / pas_azimuth)):
+        raise ValueError(f"pas_azimuth={pas_azimuth} ne divise pas 360 : la grille ne se refermerait pas en azimut")
+
+
+class FacadeGainTable:
+    def __init__(self, tables, azimuth0, pas_azimuth, elevation0, pas_elevation, parametres=None):
+        if tables.ndim != 4 or tables.shape[1] != 3:
+            raise ValueError(f"Table de forme {tables.shape} : format attendu (12, 3, élévations, azimuts), "
+                             f"à reconstruire avec FacadeGainTable.build")
+        check_pas_azimuth(pas_azimuth)
+        self.tables = tables  # float32 (12 mois, 3, élévations, azimuts) : [direct pvlib, direct trigo, diffus] en W
+        self.azimuth0 = azimuth0
+        self.pas_azimuth = pas_azimuth
+        self.elevation0 = elevation0
+        self.pas_elevation = pas_elevation
+        self.n_elevation = tables.shape[2]
+        self.n_azimuth = tables.shape[3]
+        self.elevation_max = elevation0 + (self.n_elevation - 1) * pas_elevation
+        self.parametres = parametres if parametres is not None else {}
+        self.angle_condition = self.parametres.get("angle_condition", -math.inf)
+
+    # -------- CONSTRUCTION (PVLIB, UNE SEULE FOIS PAR BATIMENT) --------
+    @classmethod
+    def build(cls, lat, long, altitude, bat_azimuth, surface_vitrage, facteur_solaire, rho, angle_condition,
+              pas_azimuth=1.0, pas_elevation=0.5):
+        import pandas as pd
+        import pvlib
+
+        check_pas_azimuth(pas_azimuth)
+        # Turbidité de Linke (moyenne des valeurs journalières) et irradiance extraterrestre de chaque mois
+        jours = pd.date_range("2023-01-01", "2023-12-31", freq="D", tz="UTC")
+        linke_mensuel = pvlib.clearsky.lookup_linke_turbidity(jours, lat, long).groupby(jours.month).mean().to_numpy()
+        dni_extra_mensuel = pvlib.irradiance.get_extra_radiation(jours).groupby(jours.month).mean().to_numpy()
+
+        azimuths = np.arange(0, 360 + pas_azimuth / 2, pas_azimuth)
+        elevations = np.arange(ELEVATION_MIN, 90 + pas_elevation / 2, pas_elevation)
+        pression = pvlib.atmosphere.alt2pres(altitude)
+        refraction = np.vectorize(pvlib.spa.atmospheric_refraction_correction)(pression / 100, TEMPERATURE_AIR,
+                                                                               elevations, ATMOS_REFRACT)
+        zenith = 90 - (elevations + refraction)  # Zénith apparent
+        airmass_absolute = pvlib.atmosphere.get_absolute_airmass(pvlib.atmosphere.get_relative_airmass(zenith),
+                                                                 pression)
+        # Grille aplatie : chaque point (élévation, azimut) est traité comme un instant
+        grille_elevation = np.repeat(elevations, len(azimuths))
+        grille_zenith = np.repeat(zenith, len(azimuths))
+        grille_azimuth = np.tile(azimuths, len(elevations))
+        zeros = np.zeros_like(grille_elevation)
+        facades = np.asarray(bat_azimuth, dtype=float)
+        poids = facteur_solaire * np.asarray(surface_vitrage, dtype=float)[np.newaxis, :]
+        tables = np.empty((12, 3, len(elevations), len(azimuths)), dtype=np.float32)
+        for mois in range(12):
+            clearsky = pvlib.clearsky.ineichen(zenith, airmass_absolute, linke_mensuel[mois], altitude=altitude,
+                                               dni_extra=dni_extra_mensuel[mois])
+            dni, dhi, ghi = (np.repeat(np.nan_to_num(np.asarray(clearsky[composante], dtype=float)), len(azimuths))
+                             for composante in ("dni", "dhi", "ghi"))
+            irr_pvlib = {composante: get_irr_vertical_surfaces(dni=dni_grille, dhi=dhi_grille, ghi=ghi_grille,
+                                                               facades_azimuth=facades, solar_zenith=grille_zenith,
+                                                               solar_azimuth=grille_azimuth, rho=rho)
+                         for composante, (dni_grille, dhi_grille, ghi_grille) in (("direct", (dni, zeros, zeros)),
+                                                                                  ("diffus", (zeros, dhi, ghi)))}
+            # Direct trigo sans condition d'élévation (angle_condition = -inf), appliquée à la requête
+            irr_trigo_direct = irradiance_trigo_array(dni=dni[:, np.newaxis], dhi=zeros[:, np.newaxis],
+                                                      ghi=zeros[:, np.newaxis],
+                                                      solar_angle=grille_elevation[:, np.newaxis],
+                                                      solar_azimuth=grille_azimuth[:, np.newaxis],
+                                                      facade_azimuth=facades[np.newaxis, :],
+                                                      angle_condition=-math.inf, rho=rho)
+            irr_trigo_diffus = irradiance_trigo_array(dni=zeros[:, np.newaxis], dhi=dhi[:, np.newaxis],
+                                                      ghi=ghi[:, np.newaxis],
+                                                      solar_angle=grille_elevation[:, np.newaxis],
+                                                      solar_azimuth=grille_azimuth[:, np.newaxis],
+                                                      facade_azimuth=facades[np.newaxis, :],
+                                                      angle_condition=angle_condition, rho=rho)
+            # Même moyenne (pvlib + trigo) / 2 que solar_management
+            for composante, irr in enumerate((irr_pvlib["direct"], irr_trigo_direct,
+                                              irr_pvlib["diffus"] + irr_trigo_diffus)):
+                apport = ((irr / 2) * poids).sum(axis=1)
+                tables[mois, composante] = apport.reshape(len(elevations), len(azimuths))
+        parametres = {"lat": lat, "long": long, "altitude": altitude, "bat_azimuth": list(map(float, bat_azimuth)),
+                      "surface_vitrage": list(map(float, surface_vitrage)), "facteur_solaire": facteur_solaire,
+                      "rho": rho, "angle_condition": angle_condition}
+        return cls(tables, 0.0, pas_azimuth, ELEVATION_MIN, pas_elevation, parametres)
+
+    # -------- STOCKAGE : TABLE BINAIRE .npy (MEMORY-MAPPABLE) + GRILLE EN .json --------
+    def save(self, path):
+        np.save(f"{path}.npy", self.tables)
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({"azimuth0": self.azimuth0, "pas_azimuth": self.pas_azimuth, "elevation0": self.elevation0,
+                       "pas_elevation": self.pas_elevation, "parametres": self.parametres}, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(f"{path}.json", encoding="utf-8") as f:
+            grille = json.load(f)
+        tables = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        return cls(tables, grille["azimuth0"], grille["pas_azimuth"], grille["elevation0"], grille["pas_elevation"],
+                   grille["parametres"])
+
+    # -------- REQUETE TEMPS REEL : INTERPOLATION BILINEAIRE (PUR PYTHON, QUELQUES MICROSECONDES) --------
+    def gain(self, solar_azimuth, solar_elevation, cloud, mois):
+        if solar_elevation < self.elevation0:
+            return 0.0  # Soleil sous l'horizon
+        x = ((solar_azimuth % 360) - self.azimuth0) / self.pas_azimuth
+        y = (min(solar_elevation, self.elevation_max) - self.elevation0) / self.pas_elevation
+        i = min(int(x), self.n_azimuth - 2)
+        j = min(int(y), self.n_elevation - 2)
+        fx = x - i
+        fy = y - j
+        tables = self.tables
+        m = mois - 1
+        composantes = (0, 1, 2) if self.angle_condition < solar_elevation else (0, 2)  # Direct trigo masqué
+        valeurs = [(float(tables[m, c, j, i]) * (1 - fx) + float(tables[m, c, j, i + 1]) * fx) * (1 - fy)
+                   + (float(tables[m, c, j + 1, i]) * (1 - fx) + float(tables[m, c, j + 1, i + 1]) * fx) * fy
+                   for c in composantes]
+        return sum(valeurs[:-1]) * math.exp(-3 * cloud / 100) + valeurs[-1]
+
+    # -------- REQUETES PAR TABLEAUX --------
+    def gain_array(self, solar_azimuth, solar_elevation, cloud, mois):
+        solar_elevation = np.asarray(solar_elevation, dtype=float)
+        x = ((np.asarray(solar_azimuth, dtype=float) % 360) - self.azimuth0) / self.pas_azimuth
+        y = (np.clip(solar_elevation, self.elevation0, self.elevation_max) - self.elevation0) / self.pas_elevation
+        i = np.minimum(x.astype(int), self.n_azimuth - 2)
+        j = np.minimum(y.astype(int), self.n_elevation - 2)
+        m = np.asarray(mois, dtype=int) - 1
+        fx = x - i
+        fy = y - j
+        valeurs = []
+        for composante in (0, 1, 2):
+            table = self.tables[:, composante]
+            valeurs.append((table[m, j, i] * (1 - fx) + table[m, j, i + 1] * fx) * (1 - fy)
+                           + (table[m, j + 1, i] * (1 - fx) + table[m, j + 1, i + 1] * fx) * fy)
+        direct = valeurs[0] + np.where(self.angle_condition < solar_elevation, valeurs[1], 0.0)
+        gain = direct * np.exp(-3 * np.asarray(cloud, dtype=float) / 100) + valeurs[2]
+        return np.where(solar_elevation < self.elevation0, 0.0, gain)
+
+
+if __name__ == "__main__":
+    from batch import building_from_constants, load_manifest, select_building, solar_kwargs
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", help="Chemin de la table (sans extension) : <output>.npy et <output>.json")
+    parser.add_argument("--manifest", default=None, help="Manifeste JSON (voir batch.py), défaut : constantes de main.py")
+    parser.add_argument("--batiment", default=None, help="Nom du bâtiment du manifeste (défaut : le premier)")
+    parser.add_argument("--pas-azimuth", type=float, default=1.0, help="Pas de la grille en azimut [°]")
+    parser.add_argument("--pas-elevation", type=float, default=0.5, help="Pas de la grille en élévation [°]")
+    args = parser.parse_args()
+    if args.manifest is not None:
+        building = select_building(load_manifest(args.manifest), nom=args.batiment)
+    else:
+        building = building_from_constants()
+    table = FacadeGainTable.build(**solar_kwargs(building), pas_azimuth=args.pas_azimuth, pas_elevation=args.pas_elevation)
+    table.save(args.output)
+    print(f"Table {table.tables.shape} -> {args.output}.npy")
@@ -0,0 +1,199 @@
+import os
+
+import numpy as np
+
+import main
+from batch import boiler_from_building
+from instrumentation import TIMINGS
+from radiator import RadiateurFleet
+from solar import (calculate_real_irradiance, get_clear_sky_rad, get_irr_vertical_surfaces, get_solar_position_row,
+                   irradiance_trigo_array)
+
+
+# -------------------------------------------------------------------------
+# Moteur de recalcul incrémental : chaque étape déclare ses dépendances (entrées ou étapes précédentes)
+# Une étape n'est recalculée que si la version d'une de ses dépendances a changé depuis son dernier calcul.
+# Une sortie recalculée mais identique à la précédente ne fait pas changer sa version (les étapes suivantes
+# ne sont donc pas recalculées).
+# -------------------------------------------------------------------------
+def _equal(a, b):
+    if a is b:
+        return True
+    try:
+        return bool(np.array_equal(a, b))  # Nombres, tuples, tableaux
+    except (TypeError, ValueError):
+        return False
+
+
+class IncrementalEngine:
+    def __init__(self, timings=TIMINGS):
+        self.timings = timings
+        self.stages = {}  # Nom -> (fonction, dépendances), dans l'ordre de déclaration (ordre topologique)
+        self.values = {}  # Valeurs des entrées et sorties des étapes
+        self.versions = {}
+        self.recomputed = []  # Etapes recalculées lors de la dernière évaluation
+        self._seen = {}  # Etape -> versions des dépendances lors de son dernier calcul
+
+    # La fonction reçoit ses dépendances en arguments nommés
+    def add_stage(self, name, function, inputs):
+        self.stages[name] = (function, tuple(inputs))
+
+    def set(self, **inputs):
+        for name, value in inputs.items():
+            if name not in self.values or not _equal(self.values[name], value):
+                self.values[name] = value
+                self.versions[name] = self.versions.get(name, 0) + 1
+
+    # Force le recalcul d'une étape (ex : dépendance extérieure non déclarée comme entrée)
+    def invalidate(self, name):
+        self._seen.pop(name, None)
+
+    def evaluate(self, **inputs):
+        self.set(**inputs)
+        self.recomputed = []
+        for name, (function, dependencies) in self.stages.items():
+            versions = tuple(self.versions[dependency] for dependency in dependencies)
+            if self._seen.get(name) == versions:
+                continue
+            with self.timings.stage(name):
+                value = function(**{dependency: self.values[dependency] for dependency in dependencies})
+            self._seen[name] = versions
+            self.recomputed.append(name)
+            self.set(**{name: value})
+        return self.values
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+# -------------------------------------------------------------------------
+# Estimation de main.estimation découpée en étapes :
+#   temperature -> loi_eau -> puissance_radiateurs
+#   today -> instant -> position -> clear_sky -> facades (apports par W/m² de DNI + apports diffus)
+#   cloud -> dni_corrige -> apports_solaires
+# Les deux modèles d'irradiance (pvlib isotrope et trigo) sont linéaires en DNI : un changement de nébulosité ne
+# recalcule que la correction du DNI et la somme des apports.
+# -------------------------------------------------------------------------
+def _boiler_curve(chaudiere):
+    boiler = boiler_from_building({"chaudiere": chaudiere})
+    return boiler, boiler.pente_temp_eau, boiler.depla_parallele
+
+
+def _loi_eau(boiler_curve, temperature, nombre):
+    boiler = boiler_curve[0]
+    if np.ndim(temperature) == 0:
+        t_depart = boiler.calculer_t_depart(temperature_ext=temperature)
+        return t_depart, boiler.calculer_puissance(temperature_depart_eau=t_depart) * nombre
+    t_depart = boiler.calculer_t_depart_serie(temperatures_ext=temperature)
+    return t_depart, boiler.calculer_puissance_serie(temperatures_depart_eau=t_depart, nombre=nombre)
+
+
+# Signature (taille, mtime) des inventaires, relevée à chaque évaluation : un inventaire modifié sur disque
+# reconstruit le parc (inventory.load_inventory ne relit le CSV que si son contenu a changé)
+def _inventaires(radiateurs):
+    signatures = []
+    for fichier, _ in radiateurs:
+        stat = os.stat(fichier)
+        signatures.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signatures)
+
+
+def _radiateurs_parc(radiateurs, inventaires):
+    return [RadiateurFleet.from_csv(fichier, t_entree_dim=regime[0], t_sortie_dim=regime[1])
+            for fichier, regime in radiateurs]
+
+
+def _puissance_radiateurs(radiateurs_parc, loi_eau):
+    puissance = sum(radiateurs.puissance_totale(t_entree=loi_eau[0]) for radiateurs in radiateurs_parc)
+    return float(puissance) if np.ndim(puissance) == 0 else puissance
+
+
+def _instant(today, time_bucket):
+    import pandas as pd
+
+    instant = pd.Timestamp(today)
+    return instant.floor(time_bucket) if time_bucket is not None else instant
+
+
+def _position(instant, lat, long, altitude):
+    solar_position = get_solar_position_row(today=instant, lat=lat, long=long, altitude=altitude)
+    return (solar_position['azimuth'].values[0], solar_position['elevation'].values[0],
+            solar_position['apparent_zenith'].values[0])
+
+
+def _clear_sky(instant, lat, long, altitude, position):
+    return get_clear_sky_rad(latitude=lat, longitude=long, today=instant, elevation=position[1], altitude=altitude)
+
+
+# Ligne 0 : DNI unitaire seul, ligne 1 : DHI et GHI seuls (même moyenne pvlib / trigo que solar_management)
+def _facades_apports(position, clear_sky, facades, facteur_solaire, rho, angle_condition):
+    azimuth, elevation, zenith = position
+    bat_azimuth, surface_vitrage = facades
+    dni = np.array([1.0, 0.0])
+    dhi = np.array([0.0, clear_sky[1]])
+    ghi = np.array([0.0, clear_sky[2]])
+    irr_pvlib = get_irr_vertical_surfaces(dni=dni, dhi=dhi, ghi=ghi, facades_azimuth=bat_azimuth,
+                                          solar_zenith=np.full(2, zenith), solar_azimuth=np.full(2, azimuth), rho=rho)
+    irr_trigo = irradiance_trigo_array(dni=dni[:, np.newaxis], dhi=dhi[:, np.newaxis], ghi=ghi[:, np.newaxis],
+                                       solar_angle=elevation, solar_azimuth=azimuth,
+                                       facade_azimuth=np.asarray(bat_azimuth, dtype=float)[np.newaxis, :],
+                                       angle_condition=angle_condition, rho=rho)
+    apports = ((irr_pvlib + irr_trigo) / 2 * facteur_solaire * np.asarray(surface_vitrage, dtype=float)).sum(axis=1)
+    return apports[0], apports[1]
+
+
+def _dni_corrige(clear_sky, cloud):
+    return calculate_real_irradiance(dni=clear_sky[0], cloud_percentage=cloud)
+
+
+def _apports_solaires(facades_apports, dni_corrige):
+    return facades_apports[0] * dni_corrige + facades_apports[1]
+
+
+class IncrementalEstimation(IncrementalEngine):
+    def __init__(self, lat, long, altitude=main.ALTITUDE, time_bucket=None, timings=TIMINGS):
+        super().__init__(timings=timings)
+        # Paramètres du bâtiment (mêmes valeurs que main.estimation), modifiables via set()
+        self.set(lat=lat, long=long, altitude=altitude, time_bucket=time_bucket,
+                 chaudiere={"puissance_nominale": main.PUISSANCE_NOMINALE, "puissance_min": main.PUISSANCE_MIN,
+                            "t_ext_base": main.T_EXT_BASE, "t_ext_non_chauffage": main.T_EXT_NON_CHAUFFAGE,
+                            "t_max_chaudiere": main.T_MAX_CHAUDIERE, "t_min_chaudiere": main.T_MIN_CHAUDIERE},
+                 nombre=main.NOMBRE,
+                 radiateurs=((f"data/{main.FICHIERS[0]}.csv", tuple(main.REGIME_DIM[0])),),
+                 facades=(tuple(main.BAT_AZIMUTH), tuple(main.SURFACE_VITRAGE)),
+                 facteur_solaire=main.FACTEUR_SOLAIRE, rho=main.RHO, angle_condition=main.ANGLE_CONDITION)
+        self.add_stage("boiler_curve", _boiler_curve, ["chaudiere"])
+        self.add_stage("loi_eau", _loi_eau, ["boiler_curve", "temperature", "nombre"])
+        self.add_stage("radiateurs_parc", _radiateurs_parc, ["radiateurs", "inventaires"])
+        self.add_stage("puissance_radiateurs", _puissance_radiateurs, ["radiateurs_parc", "loi_eau"])
+        self.add_stage("instant", _instant, ["today", "time_bucket"])
+        self.add_stage("position", _position, ["instant", "lat", "long", "altitude"])
+        self.add_stage("clear_sky", _clear_sky, ["instant", "lat", "long", "altitude", "position"])
+        self.add_stage("facades_apports", _facades_apports,
+                       ["position", "clear_sky", "facades", "facteur_solaire", "rho", "angle_condition"])
+        self.add_stage("dni_corrige", _dni_corrige, ["clear_sky", "cloud"])
+        self.add_stage("apports_solaires", _apports_solaires, ["facades_apports", "dni_corrige"])
+
+    # Même dictionnaire de résultats que main.estimation
+    def estimation(self, cloud, temperature, today=None):
+        from datetime import datetime as dt
+
+        values = self.evaluate(cloud=cloud, temperature=temperature, today=today if today is not None else dt.now(),
+                               inventaires=_inventaires(self.values["radiateurs"]))
+        t_depart, puissance_chaudiere = values["loi_eau"]
+        _, pente, deplacement = values["boiler_curve"]
+        azimuth, elevation, _ = values["position"]
+        dni, dhi, ghi = values["clear_sky"]
+        return {"t_depart": t_depart,
+                "puissance_chaudiere": puissance_chaudiere,
+                "pente": pente,
+                "deplacement": deplacement,
+                "puissance_radiateurs": values["puissance_radiateurs"],
+                "apports_solaires": values["apports_solaires"],
+                "solar_azimuth": azimuth,
+                "solar_elevation": elevation,
+                "dni": dni,
+                "dhi": dhi,
+                "ghi": ghi,
+                "dni_corrige": values["dni_corrige"],
+                "puissance_totale": values["puissance_radiateurs"] + values["apports_solaires"]}
@@ -0,0 +1,114 @@
+import functools
+import json
+import numbers
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# -------------------------------------------------------------------------
+# Temps d'exécution par étape (geocode, météo, chaudière, radiateurs, solaire,...)
+# -------------------------------------------------------------------------
+class StageTimings:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = {}
+        self.total = {}
+        self.last = {}
+        self.max = {}
+
+    def record(self, stage, duration):
+        with self._lock:
+            self.count[stage] = self.count.get(stage, 0) + 1
+            self.total[stage] = self.total.get(stage, 0) + duration
+            self.last[stage] = duration
+            self.max[stage] = max(self.max.get(stage, 0), duration)
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self):
+        with self._lock:
+            return {stage: {"count": self.count[stage],
+                            "total_s": self.total[stage],
+                            "mean_s": self.total[stage] / self.count[stage],
+                            "last_s": self.last[stage],
+                            "max_s": self.max[stage]} for stage in self.count}
+
+
+TIMINGS = StageTimings()  # Registre par défaut alimenté par @timed
+
+
+# -------- DECORATEUR : TEMPS ET NOMBRE D'APPELS D'UNE ETAPE --------
+def timed(stage, timings=TIMINGS):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings.record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# -------- SORTIES STRUCTUREES : JSON LINES ET FORMAT TEXTE PROMETHEUS --------
+def format_json_line(resultats, timings=TIMINGS):
+    return json.dumps({**resultats, "timings": timings.summary()}, default=float, ensure_ascii=False)
+
+
+def format_prometheus(resultats, timings=TIMINGS, prefix="estimation"):
+    lines = []
+    for name, value in resultats.items():
+        if isinstance(value, numbers.Number) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {float(value)}")
+    summary = timings.summary()
+    lines.append(f"# TYPE {prefix}_stage_seconds_total counter")
+    lines.extend(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {stats["total_s"]}' for stage, stats in summary.items())
+    lines.append(f"# TYPE {prefix}_stage_calls_total counter")
+    lines.extend(f'{prefix}_stage_calls_total{{stage="{stage}"}} {stats["count"]}' for stage, stats in summary.items())
+    return "\n".join(lines)
+
+
+# -------- PROFILAGE D'UNE EXECUTION (cProfile OU tracemalloc), RAPPORT SUR STDERR --------
+@contextmanager
+def profiling(mode=None, output=None):
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output is not None:
+                profiler.dump_stats(output)
+            else:
+                pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+    elif mode == "tracemalloc":
+        import tracemalloc
+
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"tracemalloc : actuel {current / 2 ** 20:.2f} MiB, pic {peak / 2 ** 20:.2f} MiB", file=sys.stderr)
+            for statistic in snapshot.statistics("lineno")[:10]:
+                print(statistic, file=sys.stderr)
+            if output is not None:
+                snapshot.dump(output)
+    else:
+        yield
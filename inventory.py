@@ -0,0 +1,170 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# -------------------------------------------------------------------------
+# Inventaires de radiateurs (data/*.csv) : validation unique puis cache colonnaire .npy
+# Le cache (dossier .inventaire/ à côté du CSV) contient, par contenu du CSV, un dossier <nom>.<sha256[:16]>/ avec
+# une colonne .npy par grandeur, et un index <nom>.json (taille, mtime et SHA-256 du CSV source) publié en dernier.
+# Chaque écrivain prépare ses fichiers sous un nom temporaire unique : plusieurs processus peuvent construire le
+# même cache en parallèle (batch.py), un lecteur ne voit jamais de colonne tronquée.
+# Les exécutions suivantes projettent les .npy en mémoire (mmap) et ne relisent le CSV que si sa taille ou son
+# mtime change ET que son contenu (hash) a réellement changé.
+# -------------------------------------------------------------------------
+SCHEMA = {"puissance_nominale": "Puissance [W]", "consigne": "Consigne", "classe": "Classe"}  # Colonne -> en-tête CSV
+CACHE_DIR = ".inventaire"
+VERSION = 2  # A incrémenter si le format du cache change
+CHUNKSIZE = 100_000  # Lignes du CSV lues et validées par bloc
+
+
+# -------- VALIDATION D'UN BLOC DU CSV --------
+def validate_chunk(chunk, path, premiere_ligne):
+    import pandas as pd
+
+    colonnes = {}
+    for nom, entete in SCHEMA.items():
+        if nom == "classe":
+            if chunk[entete].isna().any():
+                ligne = premiere_ligne + int(np.flatnonzero(chunk[entete].isna().to_numpy())[0])
+                raise ValueError(f"{path} ligne {ligne} : colonne '{entete}' vide")
+            colonnes[nom] = chunk[entete].astype(str).to_numpy()
+            continue
+        valeurs = pd.to_numeric(chunk[entete], errors="coerce").to_numpy(dtype=float)
+        invalides = ~np.isfinite(valeurs)
+        if nom == "puissance_nominale":
+            invalides |= valeurs <= 0
+        if invalides.any():
+            ligne = premiere_ligne + int(np.flatnonzero(invalides)[0])
+            raise ValueError(f"{path} ligne {ligne} : valeur invalide dans '{entete}' ({chunk[entete].iloc[ligne - premiere_ligne]!r})")
+        colonnes[nom] = valeurs
+    return colonnes
+
+
+# -------- LECTURE EN FLUX DU CSV (SEULES LES COLONNES DU SCHEMA SONT LUES) --------
+def parse_csv(path, chunksize=CHUNKSIZE):
+    import pandas as pd
+
+    entetes = pd.read_csv(path, delimiter=";", encoding="utf-8-sig", nrows=0).columns
+    manquantes = [entete for entete in SCHEMA.values() if entete not in entetes]
+    if manquantes:
+        raise ValueError(f"{path} : colonne(s) manquante(s) {manquantes}")
+    blocs = {nom: [] for nom in SCHEMA}
+    premiere_ligne = 2  # Ligne 1 = en-têtes
+    for chunk in pd.read_csv(path, delimiter=";", encoding="utf-8-sig", usecols=list(SCHEMA.values()),
+                             dtype={SCHEMA["classe"]: str}, chunksize=chunksize):
+        for nom, valeurs in validate_chunk(chunk, path, premiere_ligne).items():
+            blocs[nom].append(valeurs)
+        premiere_ligne += len(chunk)
+    return {nom: np.concatenate(valeurs) if valeurs else np.empty(0) for nom, valeurs in blocs.items()}
+
+
+def file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(bloc)
+    return sha256.hexdigest()
+
+
+# -------- CACHE COLONNAIRE --------
+def cache_paths(path, cache_dir=None):
+    source = os.path.abspath(path)
+    dossier = cache_dir if cache_dir is not None else os.path.join(os.path.dirname(source), CACHE_DIR)
+    nom = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(dossier, nom), os.path.join(dossier, f"{nom}.json")
+
+
+def data_dir(prefixe, sha256):
+    return f"{prefixe}.{sha256[:16]}"
+
+
+def _write_cache(prefixe, index_path, colonnes, signature):
+    dossier = os.path.dirname(prefixe)
+    os.makedirs(dossier, exist_ok=True)
+    destination = data_dir(prefixe, signature["sha256"])
+    if not os.path.isdir(destination):
+        temporaire = tempfile.mkdtemp(dir=dossier, prefix=".tmp-")
+        try:
+            for nom, valeurs in colonnes.items():
+                np.save(os.path.join(temporaire, f"{nom}.npy"), valeurs.astype(str) if valeurs.dtype == object else valeurs)
+            os.rename(temporaire, destination)
+        except OSError:
+            if not os.path.isdir(destination):
+                raise
+            # Même contenu déjà publié par un autre processus
+        finally:
+            shutil.rmtree(temporaire, ignore_errors=True)
+    _write_index(index_path, signature)  # Index publié en dernier : un cache incomplet reste invalide
+    # Colonnes des contenus précédents (un lecteur qui les projette encore en mémoire n'est pas affecté)
+    base = os.path.basename(prefixe) + "."
+    for entree in os.listdir(dossier):
+        chemin = os.path.join(dossier, entree)
+        if (entree.startswith(base) and len(entree) == len(base) + 16 and chemin != destination
+                and os.path.isdir(chemin)):
+            shutil.rmtree(chemin, ignore_errors=True)
+
+
+def _write_index(index_path, signature):
+    descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(index_path), prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(descripteur, "w", encoding="utf-8") as f:
+            json.dump(signature, f, indent=2)
+        os.replace(temporaire, index_path)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+def _read_index(index_path):
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_inventory(path, cache_dir=None, mmap=True):
+    prefixe, index_path = cache_paths(path, cache_dir)
+    stat = os.stat(path)
+    signature = {"version": VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    index = _read_index(index_path)
+    if index is not None and index.get("version") == VERSION:
+        a_jour = index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns
+        if not a_jour and index["size"] == stat.st_size and index.get("sha256") == file_hash(path):
+            # Fichier touché (copie, checkout...) sans modification du contenu : seul l'index est mis à jour
+            try:
+                _write_index(index_path, {**signature, "sha256": index["sha256"]})
+            except OSError:
+                pass
+            a_jour = True
+        if a_jour:
+            dossier = data_dir(prefixe, index["sha256"])
+            try:
+                return {nom: np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r" if mmap else None)
+                        for nom in SCHEMA}
+            except (OSError, ValueError, EOFError):
+                pass  # Cache corrompu, incomplet ou remplacé entre-temps : relecture du CSV
+    sha256 = file_hash(path)  # Hash avant lecture : un CSV modifié pendant la lecture sera relu la fois suivante
+    colonnes = parse_csv(path)
+    try:
+        _write_cache(prefixe, index_path, colonnes, {**signature, "sha256": sha256})
+    except OSError:
+        pass  # Dossier en lecture seule : le CSV sera relu à la prochaine exécution
+    return colonnes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("fichiers", nargs="+", help="Inventaires de radiateurs (.csv) à valider et mettre en cache")
+    parser.add_argument("--cache-dir", default=None, help=f"Dossier du cache (défaut : {CACHE_DIR}/ à côté de chaque CSV)")
+    args = parser.parse_args()
+    for fichier in args.fichiers:
+        colonnes = load_inventory(fichier, cache_dir=args.cache_dir)
+        print(f"{fichier} : {len(colonnes['puissance_nominale'])} radiateur(s), "
+              f"{len(np.unique(colonnes['classe']))} local(aux) -> {cache_paths(fichier, args.cache_dir)[0]}.*/")
@@ -1,13 +1,15 @@
+import argparse
 import os
 from datetime import datetime as dt
 
-import requests
-from geopy.geocoders import Nominatim
+import numpy as np
 
-from boiler import Boiler
-from radiator import Radiateur
-from solar import *
-import pandas as pd
+from instrumentation import TIMINGS, format_json_line, format_prometheus, profiling, timed
+from radiator import RadiateurFleet
+from solar import (calculate_real_irradiance, get_clear_sky_rad, get_solar_position, solar_gain_building_side,
+                   solar_gain_building_sides)
+
+# pvlib, pandas, requests et geopy ne sont importés que par les fonctions qui les utilisent
 
 # -------------------------------------------------------------------------
 # --------------------------- PARAMETERS TO STUDY -------------------------
@@ -31,93 +33,116 @@ SURFACE_VITRAGE = [153.5, 25]  # Surface de vitrage en présence sur les façade
 FACTEUR_SOLAIRE = 0.37  # Facteur solaire pour double vitrage HR
 ANGLE_CONDITION = 10  # Condition d'élévation solaire minimale (dépends de la présence de bâtiment, d'ombrage,...)
 ALTITUDE = 66  # Altitude du lieu à étudier
-TODAY = dt.now()  # Date
 RHO = 0.15  # Albedo du sol en ville
 
 # -------------------------------------------------------------------------
 # ------------------------------- CONSTANTS -------------------------------
 # -------------------------------------------------------------------------
-LAT = float(os.environ["LAT"])  # Latitude du lieu à étudier
-LONG = float(os.environ["LONG"])  # Longitude du lieu à étudier
-API_KEY_OWM = os.environ["API_KEY_OWM"]
+OWM_ENDPOINT = "http://api.openweathermap.org/data/2.5/weather"
+HTTP_TIMEOUT = 10  # Timeout des requêtes HTTP [s]
+# Variables d'environnement lues à l'utilisation (main.LAT, main.LONG, main.API_KEY_OWM) et non à l'import
+ENVIRONNEMENT = {"LAT": float,  # Latitude du lieu à étudier
+                 "LONG": float,  # Longitude du lieu à étudier
+                 "API_KEY_OWM": str}
+
+
+def __getattr__(name):
+    if name in ENVIRONNEMENT:
+        try:
+            return ENVIRONNEMENT[name](os.environ[name])
+        except KeyError:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r} : "
+                                 f"variable d'environnement {name} non définie") from None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # -------------------------------------------------------------------------
 # -------------------------------------------------------------------------
 # -------------------------------------------------------------------------
-def get_weather_conditions():
-    endpoint = "http://api.openweathermap.org/data/2.5/weather"
+@timed("weather")
+def fetch_weather_conditions(lat, long, api_key=None, session=None, endpoint=OWM_ENDPOINT, timeout=HTTP_TIMEOUT):
+    import requests
+
+    http = session if session is not None else requests  # Session poolée fournie par le mode service
     params = {
-        "lat": LAT,
-        "lon": LONG,
-        "appid": API_KEY_OWM,
+        "lat": lat,
+        "lon": long,
+        "appid": api_key if api_key is not None else os.environ["API_KEY_OWM"],
         "units": "metric"}
+    response = http.get(endpoint, params=params, timeout=timeout)
+    if response.status_code != 200:
+        raise requests.HTTPError(response.text, response=response)
+    data = response.json()
+    nuages = data['clouds']['all']
+    temperature = data['main']['temp']
+    return nuages, temperature
+
+
+def get_weather_conditions(lat, long, api_key=None, session=None, endpoint=OWM_ENDPOINT, timeout=HTTP_TIMEOUT):
+    import requests
+
     try:
-        response = requests.get(endpoint, params=params)
-        data = response.json()
-        if response.status_code == 200:
-            nuages = data['clouds']['all']
-            temperature = data['main']['temp']
-            return nuages, temperature
-        else:
-            print(response.text)
-            return 0, 0
+        return fetch_weather_conditions(lat=lat, long=long, api_key=api_key, session=session, endpoint=endpoint,
+                                        timeout=timeout)
+    except requests.HTTPError as e:
+        print(str(e))
+        return 0, 0
     except Exception as e:
         print(f"Erreur lors de la requête : {str(e)}")
         return 0, 0
 
 
 # -------------------------------------------------------------------------
-def boiler_management(p_nom, p_min, t_ext_b, t_ext_non_ch, t_max_chaud, t_min_chaud, temp, num):
-    boiler1 = Boiler(puissance_nom=p_nom,
-                     puissance_min=p_min,
-                     t_ext_base=t_ext_b,
-                     t_ext_non_chauffage=t_ext_non_ch,
-                     t_max_chaudiere=t_max_chaud,
-                     t_min_chaudiere=t_min_chaud)
-    pente_boiler, deplacement_parallele_boiler = boiler1.loi_eau_t_depart_text()
-    boiler1.loi_eau_t_ext_puissance()
-    boiler1.tracer_graphique()
-    t_depart = boiler1.calculer_t_depart(temperature_ext=temp)
-    puissance = (boiler1.calculer_puissance(temperature_depart_eau=t_depart)) * num
+@timed("boiler")
+def boiler_management(p_nom, p_min, t_ext_b, t_ext_non_ch, t_max_chaud, t_min_chaud, temp, num, graphiques=False):
+    from batch import boiler_from_building  # batch importe main
+
+    boiler1 = boiler_from_building({"chaudiere": {"puissance_nominale": p_nom,
+                                                  "puissance_min": p_min,
+                                                  "t_ext_base": t_ext_b,
+                                                  "t_ext_non_chauffage": t_ext_non_ch,
+                                                  "t_max_chaudiere": t_max_chaud,
+                                                  "t_min_chaudiere": t_min_chaud}})
+    pente_boiler, deplacement_parallele_boiler = boiler1.pente_temp_eau, boiler1.depla_parallele
+    if graphiques:
+        boiler1.tracer_graphique()
+    if np.ndim(temp) == 0:
+        t_depart = boiler1.calculer_t_depart(temperature_ext=temp)
+        puissance = (boiler1.calculer_puissance(temperature_depart_eau=t_depart)) * num
+    else:  # Série de températures extérieures (historique météo,...)
+        t_depart = boiler1.calculer_t_depart_serie(temperatures_ext=temp)
+        puissance = boiler1.calculer_puissance_serie(temperatures_depart_eau=t_depart, nombre=num)
     return t_depart, puissance, pente_boiler, deplacement_parallele_boiler
 
 
 # -------------------------------------------------------------------------
+@timed("radiator")
 def radiator_management(fichier_rad, t_entree_dim, t_sortie_dim, t_entree):
-    df_radiateurs = pd.read_csv(f"data/{fichier_rad}.csv", delimiter=";")
-    liste_de_radiateur = []
-    for index, rows in df_radiateurs.iterrows():
-        puissance_nom = int(rows["Puissance [W]"])
-        consigne_temp_ambiante = int(rows["Consigne"])
-        radiateur = Radiateur(puissance_nominale=puissance_nom,
-                              temperature_ambiante=consigne_temp_ambiante,
-                              t_entree_dim=t_entree_dim,
-                              t_sortie_dim=t_sortie_dim)
-        liste_de_radiateur.append(radiateur)
-    puissance_tot = 0
-    for radiateur in liste_de_radiateur:
-        puissance = float(radiateur.calcul_puissance(t_entree=t_entree, t_sortie=((t_entree + radiateur.t_ambiante) / 2)))  # Hypothèse : T sortie = (T entree + T ambiante)/2
-        puissance_tot += puissance
-    return puissance_tot
+    radiateurs = RadiateurFleet.from_csv(f"data/{fichier_rad}.csv", t_entree_dim=t_entree_dim, t_sortie_dim=t_sortie_dim)
+    puissance_tot = radiateurs.puissance_totale(t_entree=t_entree)  # Hypothèse : T sortie = (T entree + T ambiante)/2
+    return float(puissance_tot) if puissance_tot.ndim == 0 else puissance_tot
 
 
 # -------------------------------------------------------------------------
-def solar_management(cloud):
-    azimuth, elevation = get_solar_position(today=TODAY,
-                                            lat=LAT,
-                                            long=LONG,
-                                            altitude=ALTITUDE)
-    dni, dhi, ghi = get_clear_sky_rad(latitude=LAT,
-                                      longitude=LONG,
-                                      today=TODAY,
-                                      elevation=elevation)
+def solar_management(cloud, lat, long, today=None, altitude=ALTITUDE, bat_azimuth=BAT_AZIMUTH,
+                     surface_vitrage=SURFACE_VITRAGE, facteur_solaire=FACTEUR_SOLAIRE, rho=RHO,
+                     angle_condition=ANGLE_CONDITION):
+    today = today if today is not None else dt.now()
+    azimuth, elevation = get_solar_position(today=today,
+                                            lat=lat,
+                                            long=long,
+                                            altitude=altitude)
+    dni, dhi, ghi = get_clear_sky_rad(latitude=lat,
+                                      longitude=long,
+                                      today=today,
+                                      elevation=elevation,
+                                      altitude=altitude)
     cloud_corrected_dni = calculate_real_irradiance(dni=dni,
                                                     cloud_percentage=cloud)
 
     pv_lib_total = 0
     trigo_total = 0
-    for facade, surface in zip(BAT_AZIMUTH, SURFACE_VITRAGE):
+    for facade, surface in zip(bat_azimuth, surface_vitrage):
         apport_pvlib, apport_trigo = solar_gain_building_side(azimtuh_facade=facade,
                                                               solar_angle=elevation,
                                                               solar_azimuth=azimuth,
@@ -125,67 +150,158 @@ def solar_management(cloud):
                                                               ghi=ghi,
                                                               corrected_dni=cloud_corrected_dni,
                                                               window_surface=surface,
-                                                              facteur_solaire=FACTEUR_SOLAIRE,
-                                                              today=TODAY,
-                                                              lat=LAT,
-                                                              long=LONG,
-                                                              rho=RHO,
-                                                              angle_condition=ANGLE_CONDITION)
+                                                              facteur_solaire=facteur_solaire,
+                                                              today=today,
+                                                              lat=lat,
+                                                              long=long,
+                                                              rho=rho,
+                                                              angle_condition=angle_condition,
+                                                              altitude=altitude)
         pv_lib_total += apport_pvlib
         trigo_total += apport_trigo
     result = (pv_lib_total + trigo_total) / 2
     return result, azimuth, elevation, dni, dhi, ghi, cloud_corrected_dni
 
 
-def get_localisation_name(latitude, longitude):
-    geolocator = Nominatim(user_agent="my_geocoder")
+# -------------------------------------------------------------------------
+# Même calcul que solar_management pour toute une série d'instants (tableaux (instants,) en sortie)
+def solar_management_series(times, cloud, lat, long, altitude=ALTITUDE, bat_azimuth=BAT_AZIMUTH,
+                            surface_vitrage=SURFACE_VITRAGE, facteur_solaire=FACTEUR_SOLAIRE, rho=RHO,
+                            angle_condition=ANGLE_CONDITION):
+    apports, solar_position, (dni, dhi, ghi), cloud_corrected_dni = solar_gain_building_sides(
+        times=times,
+        lat=lat,
+        long=long,
+        altitude=altitude,
+        facades_azimuth=bat_azimuth,
+        windows_surface=surface_vitrage,
+        facteur_solaire=facteur_solaire,
+        rho=rho,
+        angle_condition=angle_condition,
+        cloud_percentage=cloud)
+    result = apports.sum(axis=1)
+    azimuth = solar_position['azimuth'].values
+    elevation = solar_position['elevation'].values
+    return result, azimuth, elevation, dni, dhi, ghi, cloud_corrected_dni
+
+
+@timed("geocode")
+def get_localisation_name(latitude, longitude, geolocator=None):
+    if geolocator is None:
+        from geopy.geocoders import Nominatim
+        geolocator = Nominatim(user_agent="my_geocoder")
     location = geolocator.reverse((latitude, longitude), language='fr')
     address = location.address if location else None
     return address
 
 
 # -------------------------------------------------------------------------
-# -------------------------------------------------------------------------
-# -------------------------------------------------------------------------
-if __name__ == "__main__":
-    localisation = get_localisation_name(LAT, LONG)
-    actual_cloud_coverage, actual_temperature = get_weather_conditions()
-    temperature_depart_chaudiere, puissance_effective_chaudiere, pente, deplacement = boiler_management(
+def estimation(cloud, temperature, lat, long, today=None, graphiques=False):
+    today = today if today is not None else dt.now()
+    t_depart, puissance_chaudiere, pente_boiler, deplacement_boiler = boiler_management(
         p_nom=PUISSANCE_NOMINALE,
         p_min=PUISSANCE_MIN,
         t_ext_b=T_EXT_BASE,
         t_ext_non_ch=T_EXT_NON_CHAUFFAGE,
         t_min_chaud=T_MIN_CHAUDIERE,
         t_max_chaud=T_MAX_CHAUDIERE,
-        temp=actual_temperature,
-        num=NOMBRE)
-    puissance_emise_radiateur = radiator_management(fichier_rad=FICHIERS[0],
-                                                    t_entree_dim=REGIME_DIM[0][0],
-                                                    t_sortie_dim=REGIME_DIM[0][1],
-                                                    t_entree=temperature_depart_chaudiere)
-
-    apports_solaire, solar_azimuth, solar_elevation, clear_sky_dni, clear_sky_dhi, clear_sky_ghi, dni_corrected = solar_management(cloud=actual_cloud_coverage)
-    puissance_thermique_totale = puissance_emise_radiateur + apports_solaire
-    print("------------------------------------------------------------------------------------------------")
-    print("DONNEES :")
-    print(f"Localisation : {localisation} \nDate : {TODAY.strftime("%d-%m-%Y")}\nHeure : {TODAY.strftime("%Hh%M")}")
-    print(f"La température extérieur est de {actual_temperature} [°C]")
-    print(f"La couverture nuageuse est de {actual_cloud_coverage} [%]")
-    print(f"Azimut du soleil: {solar_azimuth} [°]")
-    print(f"Angle d'inclinaison du soleil: {solar_elevation} [°]")
-    print("------------------------------------------------------------------------------------------------")
-    print("CHAUDIERE(S) :")
-    print(f"Pente de la courbe de chauffe : {pente} [°]")
-    print(f"Déplacement parallèle de la courbe de chauffe : {deplacement} [°C] ")
-    print(f"Température de départ chaudière : {temperature_depart_chaudiere} [°C] ")
-    print(f"Puissance effective de la chaudière : {puissance_effective_chaudiere / NOMBRE} [kW]")
-    print(f"Puissance effective totale : {puissance_effective_chaudiere} [kW] pour {NOMBRE} chaudière(s)")
-    print("------------------------------------------------------------------------------------------------")
-    print("RADIATEUR(S) :")
-    print(f"Puissance émise par les radiateurs à {temperature_depart_chaudiere} [°C] : {puissance_emise_radiateur / 1000} [kW] ")
-    print("------------------------------------------------------------------------------------------------")
-    print("APPORTS SOLAIRES :")
-    print(f"L'apport solaire est de : {apports_solaire} [Watts] soit {apports_solaire / 1000} [kW] ")
-    print("------------------------------------------------------------------------------------------------")
-    print("PUISSANCE THERMIQUE TOTALE :")
-    print(f"L'apport thermique est de : {puissance_thermique_totale} [Watts] soit {puissance_thermique_totale / 1000} [kW] ")
+        temp=temperature,
+        num=NOMBRE,
+        graphiques=graphiques)
+    puissance_radiateurs = radiator_management(fichier_rad=FICHIERS[0],
+                                               t_entree_dim=REGIME_DIM[0][0],
+                                               t_sortie_dim=REGIME_DIM[0][1],
+                                               t_entree=t_depart)
+    apports, azimuth, elevation, dni, dhi, ghi, dni_corrige = solar_management(cloud=cloud, lat=lat, long=long,
+                                                                             today=today)
+    return {"t_depart": t_depart,
+            "puissance_chaudiere": puissance_chaudiere,
+            "pente": pente_boiler,
+            "deplacement": deplacement_boiler,
+            "puissance_radiateurs": puissance_radiateurs,
+            "apports_solaires": apports,
+            "solar_azimuth": azimuth,
+            "solar_elevation": elevation,
+            "dni": dni,
+            "dhi": dhi,
+            "ghi": ghi,
+            "dni_corrige": dni_corrige,
+            "puissance_totale": puissance_radiateurs + apports}
+
+
+# -------------------------------------------------------------------------
+# -------------------------------------------------------------------------
+# -------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--service", action="store_true", help="Ré-estimation périodique (mode service)")
+    parser.add_argument("--interval", type=float, default=300, help="Période de ré-estimation [s]")
+    parser.add_argument("--weather-ttl", type=float, default=600, help="Durée de validité des observations météo [s]")
+    parser.add_argument("--graphiques", action="store_true", help="Enregistre les graphiques de la loi d'eau dans figures/")
+    parser.add_argument("--format", choices=["texte", "json", "prometheus"], default="texte",
+                        help="Sortie : rapport texte, ligne JSON ou format texte Prometheus (résultats + temps par étape)")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"], default=None, help="Profile une exécution")
+    parser.add_argument("--profile-output", default=None, help="Fichier de sortie du profil (sinon résumé sur stderr)")
+    parser.add_argument("--owm-endpoint", default=os.environ.get("OWM_ENDPOINT", OWM_ENDPOINT),
+                        help="URL de l'API météo (ex: serveur OpenWeatherMap local de test)")
+    parser.add_argument("--time-bucket", default=None,
+                        help="Mode service : regroupement des instants pour la géométrie solaire (ex: 5min), défaut : instant exact")
+    parser.add_argument("--geocode-cache", default=None,
+                        help="Mode service : fichier JSON du cache de géocodage, conservé entre deux démarrages")
+    parser.add_argument("--site", action="append", default=[], help="Site supplémentaire 'lat,long' (répétable)")
+    args = parser.parse_args()
+    lat = float(os.environ["LAT"])  # Latitude du lieu à étudier
+    long = float(os.environ["LONG"])  # Longitude du lieu à étudier
+
+    if args.service:
+        from service import CachedGeocoder, EstimationService, WeatherClient
+        sites = [(lat, long)] + [tuple(float(v) for v in site.split(",")) for site in args.site]
+        service = EstimationService(sites=sites,
+                                    weather_client=WeatherClient(endpoint=args.owm_endpoint, ttl=args.weather_ttl),
+                                    geocoder=CachedGeocoder(path=args.geocode_cache),
+                                    interval=args.interval,
+                                    time_bucket=args.time_bucket)
+        service.run_forever()
+    else:
+        with profiling(mode=args.profile, output=args.profile_output):
+            today = dt.now()
+            localisation = get_localisation_name(lat, long)
+            actual_cloud_coverage, actual_temperature = get_weather_conditions(lat=lat, long=long,
+                                                                               endpoint=args.owm_endpoint)
+            resultats = estimation(cloud=actual_cloud_coverage, temperature=actual_temperature, lat=lat, long=long,
+                                   today=today, graphiques=args.graphiques)
+        mesures = {"localisation": localisation, "date": today.isoformat(), "lat": lat, "long": long,
+                   "temperature": actual_temperature, "nuages": actual_cloud_coverage, **resultats}
+        if args.format == "json":
+            print(format_json_line(mesures, timings=TIMINGS))
+        elif args.format == "prometheus":
+            print(format_prometheus(mesures, timings=TIMINGS))
+        else:
+            temperature_depart_chaudiere = resultats["t_depart"]
+            puissance_effective_chaudiere = resultats["puissance_chaudiere"]
+            puissance_emise_radiateur = resultats["puissance_radiateurs"]
+            apports_solaire = resultats["apports_solaires"]
+            puissance_thermique_totale = resultats["puissance_totale"]
+            print("------------------------------------------------------------------------------------------------")
+            print("DONNEES :")
+            print(f"Localisation : {localisation} \nDate : {today.strftime("%d-%m-%Y")}\nHeure : {today.strftime("%Hh%M")}")
+            print(f"La température extérieur est de {actual_temperature} [°C]")
+            print(f"La couverture nuageuse est de {actual_cloud_coverage} [%]")
+            print(f"Azimut du soleil: {resultats["solar_azimuth"]} [°]")
+            print(f"Angle d'inclinaison du soleil: {resultats["solar_elevation"]} [°]")
+            print("------------------------------------------------------------------------------------------------")
+            print("CHAUDIERE(S) :")
+            print(f"Pente de la courbe de chauffe : {resultats["pente"]} [°]")
+            print(f"Déplacement parallèle de la courbe de chauffe : {resultats["deplacement"]} [°C] ")
+            print(f"Température de départ chaudière : {temperature_depart_chaudiere} [°C] ")
+            print(f"Puissance effective de la chaudière : {puissance_effective_chaudiere / NOMBRE} [kW]")
+            print(f"Puissance effective totale : {puissance_effective_chaudiere} [kW] pour {NOMBRE} chaudière(s)")
+            print("------------------------------------------------------------------------------------------------")
+            print("RADIATEUR(S) :")
+            print(f"Puissance émise par les radiateurs à {temperature_depart_chaudiere} [°C] : {puissance_emise_radiateur / 1000} [kW] ")
+            print("------------------------------------------------------------------------------------------------")
+            print("APPORTS SOLAIRES :")
+            print(f"L'apport solaire est de : {apports_solaire} [Watts] soit {apports_solaire / 1000} [kW] ")
+            print("------------------------------------------------------------------------------------------------")
+            print("PUISSANCE THERMIQUE TOTALE :")
+            print(f"L'apport thermique est de : {puissance_thermique_totale} [Watts] soit {puissance_thermique_totale / 1000} [kW] ")
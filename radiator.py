@@ -1,5 +1,9 @@
+import numpy as np
+
 # ---------------- CONSTANTES ----------------------
 C = 4.18  # Capacité thermique massique l'eau
+EXPOSANT = 1.3  # Exposant de la loi d'émission des radiateurs (EN 442)
+TAILLE_BLOC = 4_000_000  # Nombre maximal de couples (instant, radiateur) simulés à la fois
 
 
 # -------------------------------------------------------------------------
@@ -19,3 +23,159 @@ class Radiateur:
         t_moyenne = (t_entree + t_sortie) / 2
         puissance = self.surface_chauffe * (t_moyenne - self.t_ambiante) * self.coefficient_rayonnement
         return puissance
+
+
+# -------------------------------------------------------------------------
+# Parc de radiateurs : mêmes grandeurs que Radiateur, stockées en colonnes NumPy (une valeur par émetteur)
+# -------------------------------------------------------------------------
+class RadiateurFleet:
+    def __init__(self, puissance_nominale, temperature_ambiante, t_entree_dim, t_sortie_dim, locaux=None):
+        self.puissance_nominale = np.asarray(puissance_nominale, dtype=float)
+        self.t_ambiante = np.asarray(temperature_ambiante, dtype=float)
+        self.t_entree_radiateur = np.broadcast_to(np.asarray(t_entree_dim, dtype=float), self.puissance_nominale.shape)
+        self.t_sortie_radiateur = np.broadcast_to(np.asarray(t_sortie_dim, dtype=float), self.puissance_nominale.shape)
+        self.t_moy_radiateur = (self.t_entree_radiateur + self.t_sortie_radiateur) / 2
+        self.coefficient_rayonnement = 10
+        self.surface_chauffe = self.puissance_nominale / ((self.t_moy_radiateur - self.t_ambiante) * self.coefficient_rayonnement)
+        self.debit_radiateur_nom = (self.puissance_nominale / 1000) / ((self.t_entree_radiateur - self.t_sortie_radiateur) * C)
+        # Local de chaque radiateur (index entier vers self.locaux) pour les sommes par local
+        if locaux is None:
+            locaux = np.zeros(len(self.puissance_nominale), dtype=int)
+        self.locaux, self.index_local = np.unique(np.asarray(locaux), return_inverse=True)
+
+    # Inventaire validé une fois puis relu depuis le cache colonnaire (voir inventory.py)
+    @classmethod
+    def from_csv(cls, path, t_entree_dim, t_sortie_dim, cache_dir=None):
+        from inventory import load_inventory
+
+        colonnes = load_inventory(path, cache_dir=cache_dir)
+        return cls(puissance_nominale=colonnes["puissance_nominale"],
+                   temperature_ambiante=colonnes["consigne"],
+                   t_entree_dim=t_entree_dim,
+                   t_sortie_dim=t_sortie_dim,
+                   locaux=colonnes["classe"])
+
+    def __len__(self):
+        return len(self.puissance_nominale)
+
+    # ------------------------ CALCUL PUISSANCE (T_ENTREE SCALAIRE OU VECTEUR) ----------------------------
+    # Retourne un tableau (radiateurs,) ou (températures, radiateurs)
+    def calcul_puissance(self, t_entree, t_sortie=None):
+        t_entree = np.asarray(t_entree, dtype=float)[..., np.newaxis]
+        if t_sortie is None:
+            t_sortie = (t_entree + self.t_ambiante) / 2  # Hypothèse : T sortie = (T entree + T ambiante)/2
+        else:
+            t_sortie = np.asarray(t_sortie, dtype=float)[..., np.newaxis]
+        t_moyenne = (t_entree + t_sortie) / 2
+        return self.surface_chauffe * (t_moyenne - self.t_ambiante) * self.coefficient_rayonnement
+
+    # Puissance linéaire en T moyenne : les sommes se font sur les coefficients (k = surface x coefficient),
+    # sans matrice (températures, radiateurs) intermédiaire
+    def _puissance_agregee(self, t_entree, t_sortie, k_total, k_t_ambiante):
+        t_entree = np.asarray(t_entree, dtype=float)[..., np.newaxis]
+        if t_sortie is None:
+            # T sortie = (T entree + T ambiante)/2  =>  T moyenne - T ambiante = 3/4 (T entree - T ambiante)
+            return 0.75 * (t_entree * k_total - k_t_ambiante)
+        t_moyenne = (t_entree + np.asarray(t_sortie, dtype=float)[..., np.newaxis]) / 2
+        return t_moyenne * k_total - k_t_ambiante
+
+    def puissance_totale(self, t_entree, t_sortie=None):
+        k = self.surface_chauffe * self.coefficient_rayonnement
+        return self._puissance_agregee(t_entree, t_sortie, k.sum(), (k * self.t_ambiante).sum())[..., 0]
+
+    # Puissance totale = a * T entree + b (hypothèse T sortie = (T entree + T ambiante)/2) : sert aux résolutions inverses
+    def coefficients_puissance(self):
+        k = self.surface_chauffe * self.coefficient_rayonnement
+        return 0.75 * k.sum(), -0.75 * (k * self.t_ambiante).sum()
+
+    def calcul_t_entree(self, puissance):
+        a, b = self.coefficients_puissance()
+        return (np.asarray(puissance, dtype=float) - b) / a
+
+    # Retourne (locaux, puissances) avec puissances de forme (locaux,) ou (températures, locaux)
+    def puissance_par_local(self, t_entree, t_sortie=None):
+        k = self.surface_chauffe * self.coefficient_rayonnement
+        k_local = np.bincount(self.index_local, weights=k, minlength=len(self.locaux))
+        k_t_ambiante_local = np.bincount(self.index_local, weights=k * self.t_ambiante, minlength=len(self.locaux))
+        return self.locaux, self._puissance_agregee(t_entree, t_sortie, k_local, k_t_ambiante_local)
+
+    # Ecart logarithmique nominal (régime de dimensionnement) pour la loi d'émission P = P_nom * (dT_lm / dT_lm_nom)^n
+    def ecart_logarithmique_nominal(self):
+        invalides = self.t_sortie_radiateur <= self.t_ambiante
+        if invalides.any():
+            premier = int(np.flatnonzero(invalides)[0])
+            raise ValueError(f"{int(invalides.sum())} radiateur(s) avec T sortie de dimensionnement "
+                             f"({self.t_sortie_radiateur[premier]} °C) inférieure ou égale à la consigne "
+                             f"({self.t_ambiante[premier]} °C) : loi d'émission non définie (radiateur {premier})")
+        return ((self.t_entree_radiateur - self.t_sortie_radiateur)
+                / np.log((self.t_entree_radiateur - self.t_ambiante) / (self.t_sortie_radiateur - self.t_ambiante)))
+
+    # ------------------------ SIMULATION : T RETOUR, DEBIT ET PUISSANCE PAR RADIATEUR ET PAR INSTANT ----------------------------
+    # Bilan de chaque radiateur : debit * C * (T entree - T retour) = P_nom * (dT_lm / dT_lm_nom)^n
+    # Avec u = (T retour - T ambiante) / (T entree - T ambiante), le bilan devient h(u) = -ln(K) avec
+    #   h(u) = (1 - n) ln(1 - u) + n ln(-ln u)   et   K = debit * C * 1000 * (T entree - T ambiante)^(1-n) * dT_lm_nom^n / P_nom
+    # h est décroissante et ne dépend que de n : table h -> u interpolée puis deux itérations de Newton, sans boucle
+    def simulation(self, t_entree, debit=None, exposant=EXPOSANT):
+        dt_lm_nom = self.ecart_logarithmique_nominal()
+        t_entree = np.asarray(t_entree, dtype=float)[..., np.newaxis]
+        debit = self.debit_radiateur_nom if debit is None else np.asarray(debit, dtype=float)  # [kg/s]
+        debit = np.broadcast_to(debit, np.broadcast_shapes(t_entree.shape, self.puissance_nominale.shape))
+        ecart = t_entree - self.t_ambiante
+        actif = (ecart > 0) & (debit > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_k = (np.log(debit * C * 1000 * dt_lm_nom ** exposant / self.puissance_nominale)
+                     + (1 - exposant) * np.log(ecart))
+        s = _logit_retour(np.where(actif, -log_k, 0.0), exposant)
+        u = np.where(actif, 1 / (1 + np.exp(-s)), 0.0)
+        t_retour = np.where(ecart > 0, self.t_ambiante + u * ecart, t_entree)  # Pas d'émission sous la consigne
+        puissance = np.where(actif, debit * C * 1000 * (t_entree - t_retour), 0.0)
+        # T entree manquante (NaN) : les résultats restent NaN
+        manquant = ~np.isfinite(t_entree) & np.ones_like(puissance, dtype=bool)
+        puissance = np.where(manquant, np.nan, puissance)
+        debit = np.where(manquant, np.nan, debit)
+        return {"t_retour": t_retour, "debit": debit, "puissance": puissance}
+
+    # Grandeurs du circuit par instant : T retour mélangée (pondérée par les débits), débit et puissance totale
+    # Les instants sont simulés par blocs pour borner la mémoire sur les grands parcs
+    def simulation_circuit(self, t_entree, debit=None, exposant=EXPOSANT):
+        t_entree = np.asarray(t_entree, dtype=float)
+        scalaire = t_entree.ndim == 0
+        t_entree = np.atleast_1d(t_entree)
+        debit = None if debit is None else np.asarray(debit, dtype=float)
+        pas = max(1, TAILLE_BLOC // max(len(self), 1))
+        resultats = {"t_retour": np.empty(len(t_entree)), "debit": np.empty(len(t_entree)),
+                     "puissance": np.empty(len(t_entree))}
+        for debut in range(0, len(t_entree), pas):
+            bloc = slice(debut, debut + pas)
+            debit_bloc = debit[bloc] if debit is not None and debit.ndim == 2 else debit
+            radiateurs = self.simulation(t_entree[bloc], debit=debit_bloc, exposant=exposant)
+            debit_total = radiateurs["debit"].sum(axis=-1)
+            resultats["debit"][bloc] = debit_total
+            resultats["puissance"][bloc] = radiateurs["puissance"].sum(axis=-1)
+            with np.errstate(invalid="ignore"):
+                resultats["t_retour"][bloc] = (radiateurs["debit"] * radiateurs["t_retour"]).sum(axis=-1) / debit_total
+        return {nom: float(valeurs[0]) for nom, valeurs in resultats.items()} if scalaire else resultats
+
+
+# -------- RESOLUTION DE h(u) = cible, EN VARIABLE s = logit(u) --------
+_TABLES_RETOUR = {}
+
+
+def _h_retour(s, exposant):
+    log_u = -np.log1p(np.exp(-s))
+    log_1_moins_u = -np.log1p(np.exp(s))
+    return (1 - exposant) * log_1_moins_u + exposant * np.log(-log_u)
+
+
+def _logit_retour(cible, exposant, iterations=2):
+    if exposant not in _TABLES_RETOUR:
+        s = np.linspace(-30, 30, 6001)
+        _TABLES_RETOUR[exposant] = (-_h_retour(s, exposant), s)  # -h croissante pour np.interp
+    moins_h, s_table = _TABLES_RETOUR[exposant]
+    s = np.interp(-cible, moins_h, s_table)
+    for _ in range(iterations):
+        u = 1 / (1 + np.exp(-s))
+        log_u = -np.log1p(np.exp(-s))
+        derivee = -(1 - exposant) * u + exposant * (1 - u) / log_u  # dh/ds
+        s = np.clip(s - (_h_retour(s, exposant) - cible) / derivee, -30, 30)
+    return s
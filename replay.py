@@ -0,0 +1,109 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+import main
+from batch import building_from_constants, load_manifest, select_building, solar_kwargs
+from radiator import RadiateurFleet
+
+COLONNES = {"date": "date", "temperature": "temperature", "nuages": "nuages"}  # Noms des colonnes du fichier météo
+
+
+# -------- LECTURE PAR BLOCS D'UN HISTORIQUE METEO (CSV OU PARQUET) --------
+def iter_weather_chunks(path, chunksize=8760, colonnes=COLONNES, delimiter=";"):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq  # Dépendance optionnelle, uniquement pour les fichiers Parquet
+
+        parquet_file = pq.ParquetFile(path)
+        for record_batch in parquet_file.iter_batches(batch_size=chunksize, columns=list(colonnes.values())):
+            yield record_batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, delimiter=delimiter, usecols=list(colonnes.values()), chunksize=chunksize)
+
+
+# -------- UN BLOC : CHAUDIERE, RADIATEURS ET APPORTS SOLAIRES SUR TOUS SES INSTANTS --------
+# Les valeurs manquantes restent NaN dans les résultats (aucune valeur fictive)
+# simulation=True : T retour mélangée, débit et puissance émise par la loi des radiateurs (RadiateurFleet.simulation)
+def replay_chunk(chunk, building, fleets, colonnes=COLONNES, simulation=False):
+    times = pd.DatetimeIndex(pd.to_datetime(chunk[colonnes["date"]]))
+    temperature = chunk[colonnes["temperature"]].to_numpy(dtype=float)
+    nuages = chunk[colonnes["nuages"]].to_numpy(dtype=float)
+    chaudiere = building["chaudiere"]
+    t_depart, puissance_chaudiere, pente, deplacement = main.boiler_management(
+        p_nom=chaudiere["puissance_nominale"],
+        p_min=chaudiere["puissance_min"],
+        t_ext_b=chaudiere["t_ext_base"],
+        t_ext_non_ch=chaudiere["t_ext_non_chauffage"],
+        t_max_chaud=chaudiere["t_max_chaudiere"],
+        t_min_chaud=chaudiere["t_min_chaudiere"],
+        temp=temperature,
+        num=chaudiere.get("nombre", 1))
+    puissance_radiateurs = np.zeros(len(times))
+    for radiateurs in fleets:
+        puissance_radiateurs += radiateurs.puissance_totale(t_entree=t_depart)
+    apports, azimuth, elevation, dni, dhi, ghi, dni_corrige = main.solar_management_series(
+        times=times, cloud=nuages, **solar_kwargs(building))
+    resultats = pd.DataFrame({"date": chunk[colonnes["date"]].to_numpy(),
+                              "temperature": temperature,
+                              "nuages": nuages,
+                              "t_depart": t_depart,
+                              "puissance_chaudiere": puissance_chaudiere,
+                              "puissance_radiateurs": puissance_radiateurs,
+                              "apports_solaires": apports,
+                              "solar_azimuth": azimuth,
+                              "solar_elevation": elevation,
+                              "puissance_totale": puissance_radiateurs + apports})
+    if simulation:
+        circuits = [radiateurs.simulation_circuit(t_entree=t_depart) for radiateurs in fleets]
+        debit = sum(circuit["debit"] for circuit in circuits)
+        resultats["t_retour"] = sum(circuit["debit"] * circuit["t_retour"] for circuit in circuits) / debit
+        resultats["debit"] = debit
+        resultats["puissance_emise"] = sum(circuit["puissance"] for circuit in circuits)
+    return resultats
+
+
+# -------- REJEU COMPLET : RESULTATS ECRITS BLOC PAR BLOC (MEMOIRE BORNEE) --------
+def replay(input_path, output_path, building=None, chunksize=8760, colonnes=COLONNES, delimiter=";", simulation=False):
+    building = building if building is not None else building_from_constants()
+    fleets = [RadiateurFleet.from_csv(radiateur["fichier"], t_entree_dim=radiateur["regime"][0],
+                                      t_sortie_dim=radiateur["regime"][1]) for radiateur in building["radiateurs"]]
+    parquet_writer = None
+    lignes = 0
+    try:
+        for chunk in iter_weather_chunks(input_path, chunksize=chunksize, colonnes=colonnes, delimiter=delimiter):
+            resultats = replay_chunk(chunk, building, fleets, colonnes=colonnes, simulation=simulation)
+            if output_path.endswith(".parquet"):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(resultats, preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(output_path, table.schema)
+                parquet_writer.write_table(table)
+            else:
+                resultats.to_csv(output_path, sep=";", index=False, mode="w" if lignes == 0 else "a", header=lignes == 0)
+            lignes += len(resultats)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return lignes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("meteo", help="Historique météo (.csv ou .parquet) : colonnes date, temperature, nuages")
+    parser.add_argument("-o", "--output", default="rejeu.csv", help="Résultats (.csv ou .parquet)")
+    parser.add_argument("--chunksize", type=int, default=8760, help="Nombre d'instants traités par bloc")
+    parser.add_argument("--manifest", default=None, help="Manifeste JSON (voir batch.py), défaut : constantes de main.py")
+    parser.add_argument("--batiment", default=None, help="Nom du bâtiment du manifeste à rejouer (défaut : le premier)")
+    parser.add_argument("--colonnes", type=json.loads, default=COLONNES, help="Correspondance des colonnes (JSON)")
+    parser.add_argument("--simulation", action="store_true", help="Ajoute T retour, débit et puissance émise (loi en exposant)")
+    args = parser.parse_args()
+    building = None
+    if args.manifest is not None:
+        building = select_building(load_manifest(args.manifest), nom=args.batiment)
+    n = replay(args.meteo, args.output, building=building, chunksize=args.chunksize, colonnes={**COLONNES, **args.colonnes},
+               simulation=args.simulation)
+    print(f"{n} instant(s) rejoué(s) -> {args.output}")
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import main
+from incremental import IncrementalEstimation
+from instrumentation import StageTimings
+
+
+# -------------------------------------------------------------------------
+# Observations météo : session HTTP poolée + cache avec durée de validité (TTL)
+# -------------------------------------------------------------------------
+class WeatherClient:
+    def __init__(self, endpoint=main.OWM_ENDPOINT, ttl=600, timeout=main.HTTP_TIMEOUT, pool_size=16):
+        self.endpoint = endpoint
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get_weather_conditions(self, lat, long):
+        key = (lat, long)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        try:
+            observation = main.fetch_weather_conditions(lat=lat, long=long, session=self.session,
+                                                        endpoint=self.endpoint, timeout=self.timeout)
+        except Exception as e:
+            # En cas d'échec, on garde la dernière observation connue plutôt qu'une valeur fictive
+            if cached is None:
+                raise
+            print(f"Erreur lors de la requête ({lat}, {long}), observation précédente conservée : {str(e)}")
+            return cached[1]
+        with self._lock:
+            self._cache[key] = (time.monotonic(), observation)
+        return observation
+
+    def close(self):
+        self.session.close()
+
+
+# -------------------------------------------------------------------------
+# Géocodage inverse : un seul appel Nominatim par paire de coordonnées
+# Les appels sont sérialisés et espacés d'au moins min_delay secondes (politique d'usage Nominatim : 1 requête/s)
+# Après un échec, les coordonnées ne sont pas redemandées avant retry_delay secondes (reverse retourne None)
+# -------------------------------------------------------------------------
+class CachedGeocoder:
+    def __init__(self, path=None, geolocator=None, min_delay=1.0, retry_delay=600):
+        self.path = path  # Fichier JSON optionnel pour conserver le cache entre deux démarrages
+        self.geolocator = geolocator
+        self.min_delay = min_delay  # Délai minimal entre deux requêtes de géocodage [s]
+        self.retry_delay = retry_delay  # Délai avant une nouvelle tentative après un échec [s]
+        self._cache = {}
+        self._echecs = {}  # Coordonnées -> instant du dernier échec
+        self._lock = threading.Lock()
+        self._request_lock = threading.Lock()
+        self._last_request = None
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._cache = json.load(f)
+
+    def reverse(self, lat, long):
+        key = f"{lat},{long}"
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            if key in self._echecs and time.monotonic() - self._echecs[key] < self.retry_delay:
+                return None
+        with self._request_lock:
+            with self._lock:
+                if key in self._cache:  # Résolu par un autre site pendant l'attente
+                    return self._cache[key]
+            if self._last_request is not None:
+                time.sleep(max(0, self.min_delay - (time.monotonic() - self._last_request)))
+            try:
+                address = main.get_localisation_name(lat, long, geolocator=self.geolocator)
+            except Exception:
+                with self._lock:
+                    self._echecs[key] = time.monotonic()
+                raise
+            finally:
+                self._last_request = time.monotonic()
+        with self._lock:
+            self._echecs.pop(key, None)
+            self._cache[key] = address
+            if self.path is not None:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self._cache, f, ensure_ascii=False)
+        return address
+
+
+# -------------------------------------------------------------------------
+# Service : ré-estimation périodique de plusieurs sites
+# -------------------------------------------------------------------------
+class EstimationService:
+    def __init__(self, sites, weather_client=None, geocoder=None, interval=300, max_workers=8, time_bucket=None):
+        self.sites = sites  # Liste de (lat, long)
+        self.weather_client = weather_client if weather_client is not None else WeatherClient()
+        self.geocoder = geocoder if geocoder is not None else CachedGeocoder()
+        self.interval = interval
+        self.timings = StageTimings()
+        # Un moteur incrémental par site : seules les étapes dont les entrées ont changé sont recalculées
+        self._engines = {site: IncrementalEstimation(lat=site[0], long=site[1], time_bucket=time_bucket,
+                                                     timings=self.timings) for site in sites}
+        self._localisations = {}  # Dernière adresse connue par site
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    # Entrées réseau (météo + géocodage) d'un site, exécutées en parallèle pour tous les sites
+    # L'adresse n'est qu'un libellé : un échec du géocodage ne bloque ni la météo ni l'estimation du site
+    def fetch_site(self, site):
+        lat, long = site
+        with self.timings.stage("weather"):
+            nuages, temperature = self.weather_client.get_weather_conditions(lat, long)
+        with self.timings.stage("geocode"):
+            try:
+                localisation = self.geocoder.reverse(lat, long)
+            except Exception as e:
+                print(f"Géocodage ({lat}, {long}) indisponible : {str(e)}")
+                localisation = None
+        if localisation is None:
+            localisation = self._localisations.get(site)
+        self._localisations[site] = localisation
+        return localisation, nuages, temperature
+
+    def run_once(self, today=None):
+        today = today if today is not None else dt.now()
+        futures = [self._executor.submit(self.fetch_site, site) for site in self.sites]
+        resultats = []
+        for site, future in zip(self.sites, futures):
+            lat, long = site
+            try:
+                localisation, nuages, temperature = future.result()
+            except Exception as e:
+                print(f"Site ({lat}, {long}) ignoré : {str(e)}")
+                continue
+            with self.timings.stage("estimation"):
+                resultat = self._engines[site].estimation(cloud=nuages, temperature=temperature, today=today)
+            resultat.update({"lat": lat, "long": long, "localisation": localisation, "date": today.isoformat(),
+                             "temperature": temperature, "nuages": nuages})
+            resultats.append(resultat)
+        return resultats
+
+    def run_forever(self, iterations=None):
+        iteration = 0
+        try:
+            while iterations is None or iteration < iterations:
+                start = time.monotonic()
+                for resultat in self.run_once():
+                    print(f"{resultat['date']} | {resultat['localisation']} | T ext {resultat['temperature']} [°C] | "
+                          f"nuages {resultat['nuages']} [%] | puissance totale {resultat['puissance_totale'] / 1000} [kW]")
+                print(" | ".join(f"{stage} {stats['last_s'] * 1000:.1f} ms" for stage, stats in self.timings.summary().items()))
+                iteration += 1
+                if iterations is None or iteration < iterations:
+                    time.sleep(max(0, self.interval - (time.monotonic() - start)))
+        finally:
+            self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.weather_client.close()
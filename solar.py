@@ -1,25 +1,38 @@
 import math
 
-import pandas as pd
-import pvlib
+import numpy as np
+
+from instrumentation import timed
+from solar_cache import SOLAR_CACHE
 
 
 # -------- CLEAR SKY DATA --------
-def get_clear_sky_rad(latitude, longitude, today, elevation):
-    date = pd.date_range(today, today, freq='1h', tz='UTC')
-    # Créez une instance de la classe Location avec les coordonnées de l'endroit souhaité
-    location = pvlib.location.Location(latitude, longitude)
-    # Utilisez la fonction get_clearsky pour obtenir les estimations
-    clearsky = location.get_clearsky(date, model="ineichen")
-    clear_sky_dni = clearsky["dni"].values[0]
-    clear_sky_dhi = clearsky["dhi"].values[0]
-    clear_sky_ghi = clearsky["ghi"].values[0]
+@timed("clear_sky")
+def get_clear_sky_rad(latitude, longitude, today, elevation, altitude=None, cache=SOLAR_CACHE):
+    def compute():
+        import pandas as pd
+
+        date = pd.DatetimeIndex([cache.bucket(today)])
+        # Une seule instance de Location par site (conservée dans le cache), à l'altitude du site comme en série
+        location = cache.location(latitude, longitude, altitude)
+        # Utilisez la fonction get_clearsky pour obtenir les estimations
+        clearsky = location.get_clearsky(date, model="ineichen",
+                                         linke_turbidity=cache.linke_turbidity(latitude, longitude, today))
+        return clearsky["dni"].values[0], clearsky["dhi"].values[0], clearsky["ghi"].values[0]
+
+    clear_sky_dni, clear_sky_dhi, clear_sky_ghi = cache.get_or_compute(
+        cache.key("clearsky", latitude, longitude, altitude, today), compute)
     ghi_verif = math.cos((90 - elevation) * (math.pi / 180)) * clear_sky_dni + clear_sky_dhi
     return clear_sky_dni, clear_sky_dhi, clear_sky_ghi
 
 
 # -------- CALCULATE ON ORIENTED SURFACE WITH PVLIB --------
-def get_irr_vertical_surface(dni, dhi, ghi, azimtuh_facade, solar_azimuth, today, lat, long):
+@timed("poa")
+def get_irr_vertical_surface(dni, dhi, ghi, azimtuh_facade, solar_azimuth, today, lat, long, altitude=0, rho=0.15,
+                             cache=SOLAR_CACHE):
+    import pandas as pd
+    import pvlib
+
     weather_data = pd.DataFrame(index=[today])
     weather_data['dni'] = dni
     if dni_orientation_condition(facade_azimuth=azimtuh_facade, solar_azimuth=solar_azimuth):
@@ -28,17 +41,17 @@ def get_irr_vertical_surface(dni, dhi, ghi, azimtuh_facade, solar_azimuth, today
         weather_data['dni'] = 0  # Direct Normal Irradiance (W/m^2)
     weather_data['dhi'] = dhi  # Diffuse Horizontal Irradiance (W/m^2)
     weather_data['ghi'] = ghi
-    # Calcul de la position solaire pour l'heure spécifique
-    solpos = pvlib.solarposition.get_solarposition(time=weather_data.index, latitude=lat, longitude=long)
+    # Position solaire pour l'heure spécifique (partagée avec get_solar_position via le cache)
+    solpos = get_solar_position_row(today=today, lat=lat, long=long, altitude=altitude, cache=cache)
     # Calcul de l'irradiance sur la paroi sud-est verticale
     effective_irradiance_wall = pvlib.irradiance.get_total_irradiance(surface_tilt=90, surface_azimuth=azimtuh_facade,
-                                                                      solar_zenith=solpos['apparent_zenith'],
-                                                                      solar_azimuth=solpos['azimuth'],
+                                                                      solar_zenith=solpos['apparent_zenith'].values,
+                                                                      solar_azimuth=solpos['azimuth'].values,
                                                                       dni=weather_data['dni'],
                                                                       ghi=weather_data['ghi'],
                                                                       dhi=weather_data['dhi'],
                                                                       dni_extra=None,
-                                                                      albedo=0.15)
+                                                                      albedo=rho)
     return effective_irradiance_wall['poa_global'].values[0]
 
 
@@ -61,6 +74,26 @@ def irradiance_trigo(dni, dhi, ghi, solar_angle, solar_azimuth, facade_azimuth,
     return irr
 
 
+# -------- CALCULATE ON ORIENTED SURFACE WITH TRIGO : ARRAYS (BROADCAST) --------
+def irradiance_trigo_array(dni, dhi, ghi, solar_angle, solar_azimuth, facade_azimuth, angle_condition, rho):
+    solar_angle = np.asarray(solar_angle, dtype=float)
+    solar_azimuth = np.asarray(solar_azimuth, dtype=float)
+    facade_azimuth = np.asarray(facade_azimuth, dtype=float)
+    elevation_rad = solar_angle * (np.pi / 180)
+    solar_azimuth_rad = solar_azimuth * (np.pi / 180)
+    facade_azimuth_rad = facade_azimuth * (np.pi / 180)
+    condition = (angle_condition < solar_angle) & (solar_angle < 90) & dni_orientation_condition_array(
+        facade_azimuth=facade_azimuth, solar_azimuth=solar_azimuth)
+    direct_component = np.where(condition,
+                                dni * np.cos(elevation_rad) * np.cos(solar_azimuth_rad - facade_azimuth_rad), 0)
+    b = dhi * ((1 + np.cos(90 * (np.pi / 180))) / 2) + (
+                (dhi * np.sin(elevation_rad)) / 2)  # diffuse isotrope + diffusion vers le bas
+    c = ghi * rho * ((1 - np.cos(elevation_rad)) / 2)
+    diffuse = b + c
+    irr = direct_component + diffuse
+    return irr
+
+
 # --------------------------------------------------------------
 # ------------------------ OTHERS FUNCTIONS --------------------
 # --------------------------------------------------------------
@@ -82,30 +115,53 @@ def dni_orientation_condition(facade_azimuth, solar_azimuth):
         return False
 
 
+# -------- CREATE CONDITION FOR DIRECT RADIANCE : ARRAYS (BROADCAST) --------
+# Mêmes bornes que dni_orientation_condition, sélectionnées par masque
+def dni_orientation_condition_array(facade_azimuth, solar_azimuth):
+    facade_azimuth = np.asarray(facade_azimuth, dtype=float)
+    solar_azimuth = np.asarray(solar_azimuth, dtype=float)
+    condition_inf = np.where(facade_azimuth < 90, 360 - (90 - facade_azimuth), facade_azimuth - 90)
+    condition_sup = np.where(facade_azimuth > 270, 0 + (90 - (360 - facade_azimuth)), facade_azimuth + 90)
+    return (condition_inf < solar_azimuth) & (solar_azimuth < condition_sup)
+
+
 # -------- DNI CORRECTION WITH CLOUD COVERAGE --------
 def calculate_real_irradiance(dni, cloud_percentage):
-    facteur_correction_cloud = math.exp(-3 * cloud_percentage / 100)
+    facteur_correction_cloud = np.exp(-3 * cloud_percentage / 100)
     facteur_correction = facteur_correction_cloud
     new_dni = dni * facteur_correction
     return new_dni
 
 
 # -------- GET SOLAR AZIMUTH AND ELEVATION (TILT) [°] --------
-def get_solar_position(today, lat, long, altitude):
-    data = pd.DataFrame(index=[today])
-    # Calcul de la position solaire
-    solar_position = pvlib.solarposition.get_solarposition(data.index, lat, long, altitude, method='nrel_numpy')
+def get_solar_position(today, lat, long, altitude, cache=SOLAR_CACHE):
+    solar_position = get_solar_position_row(today=today, lat=lat, long=long, altitude=altitude, cache=cache)
     # Récupération de l'azimut et de l'angle d'inclinaison du soleil
     solar_azimuth = solar_position['azimuth'].values[0]
     tilt = solar_position['elevation'].values[0]
     return solar_azimuth, tilt
 
 
+# -------- SOLAR POSITION (ONE ROW DATAFRAME), MEMOIZED PER SITE AND TIME BUCKET --------
+@timed("solar_position")
+def get_solar_position_row(today, lat, long, altitude, cache=SOLAR_CACHE):
+    def compute():
+        import pandas as pd
+        import pvlib
+
+        data = pd.DataFrame(index=[cache.bucket(today)])
+        # Calcul de la position solaire
+        return pvlib.solarposition.get_solarposition(data.index, lat, long, altitude, method='nrel_numpy')
+
+    return cache.get_or_compute(cache.key("position", lat, long, altitude, today), compute)
+
+
 # -------- MAIN LOGIC --------
 def solar_gain_building_side(azimtuh_facade, solar_angle, solar_azimuth, dhi, ghi, corrected_dni, window_surface,
-                             facteur_solaire, today, lat, long, angle_condition, rho):
+                             facteur_solaire, today, lat, long, angle_condition, rho, altitude=0):
     corr_irr_pvlib = get_irr_vertical_surface(dni=corrected_dni, dhi=dhi, ghi=ghi, solar_azimuth=solar_azimuth,
-                                              azimtuh_facade=azimtuh_facade, today=today, lat=lat, long=long)
+                                              azimtuh_facade=azimtuh_facade, today=today, lat=lat, long=long,
+                                              altitude=altitude, rho=rho)
     corr_irr_trigo = irradiance_trigo(dni=corrected_dni, dhi=dhi, ghi=ghi, solar_angle=solar_angle,
                                       solar_azimuth=solar_azimuth, facade_azimuth=azimtuh_facade,
                                       angle_condition=angle_condition, rho=rho)
@@ -114,3 +170,89 @@ def solar_gain_building_side(azimtuh_facade, solar_angle, solar_azimuth, dhi, gh
     corr_apport_puissance_pvlib = window_surface * corr_irr_finale_pvlib
     corr_apport_puissance_trigo = window_surface * corr_irr_finale_trigo
     return corr_apport_puissance_pvlib, corr_apport_puissance_trigo
+
+
+# --------------------------------------------------------------
+# ------------------ BATCH (DATETIMEINDEX x FACADES) -----------
+# --------------------------------------------------------------
+
+# -------- NAIVE TIMESTAMPS ARE TREATED AS UTC (SAME AS THE SCALAR PATH) --------
+def _as_utc_index(times):
+    import pandas as pd
+
+    times = pd.DatetimeIndex(times)
+    if times.tz is None:
+        times = times.tz_localize('UTC')
+    return times
+
+
+# -------- GET SOLAR POSITION FOR EVERY TIMESTAMP --------
+@timed("solar_position")
+def get_solar_position_series(times, lat, long, altitude):
+    import pvlib
+
+    times = _as_utc_index(times)
+    solar_position = pvlib.solarposition.get_solarposition(times, lat, long, altitude, method='nrel_numpy')
+    return solar_position
+
+
+# -------- CLEAR SKY DATA FOR EVERY TIMESTAMP (REUSES THE SOLAR POSITION) --------
+@timed("clear_sky")
+def get_clear_sky_rad_series(times, lat, long, altitude, solar_position, cache=SOLAR_CACHE):
+    times = _as_utc_index(times)
+    location = cache.location(lat, long, altitude)
+    clearsky = location.get_clearsky(times, model="ineichen", solar_position=solar_position)
+    return clearsky["dni"].values, clearsky["dhi"].values, clearsky["ghi"].values
+
+
+# -------- CALCULATE ON N ORIENTED SURFACES WITH PVLIB : ARRAYS (TIMES x FACADES) --------
+@timed("poa")
+def get_irr_vertical_surfaces(dni, dhi, ghi, facades_azimuth, solar_zenith, solar_azimuth, rho):
+    import pvlib
+
+    facades_azimuth = np.asarray(facades_azimuth, dtype=float)[np.newaxis, :]
+    solar_azimuth = np.asarray(solar_azimuth, dtype=float)[:, np.newaxis]
+    # Le DNI n'est pris en compte que si le soleil se trouve devant la façade
+    facing = dni_orientation_condition_array(facade_azimuth=facades_azimuth, solar_azimuth=solar_azimuth)
+    dni_facade = np.where(facing, np.asarray(dni, dtype=float)[:, np.newaxis], 0)
+    effective_irradiance_wall = pvlib.irradiance.get_total_irradiance(surface_tilt=90,
+                                                                      surface_azimuth=facades_azimuth,
+                                                                      solar_zenith=np.asarray(solar_zenith, dtype=float)[:, np.newaxis],
+                                                                      solar_azimuth=solar_azimuth,
+                                                                      dni=dni_facade,
+                                                                      ghi=np.asarray(ghi, dtype=float)[:, np.newaxis],
+                                                                      dhi=np.asarray(dhi, dtype=float)[:, np.newaxis],
+                                                                      dni_extra=None,
+                                                                      albedo=rho)
+    return np.broadcast_to(effective_irradiance_wall['poa_global'], dni_facade.shape)
+
+
+# -------- MAIN LOGIC (BATCH) : WINDOW GAINS FOR EVERY TIMESTAMP AND FACADE --------
+# Même apport que solar_gain_building_side / solar_management : moyenne pvlib et trigo (condition d'élévation comprise)
+# Retourne les apports (instants, façades), la position solaire, le ciel clair (dni, dhi, ghi) et le DNI corrigé
+def solar_gain_building_sides(times, lat, long, altitude, facades_azimuth, windows_surface, facteur_solaire, rho,
+                              angle_condition, cloud_percentage=0):
+    times = _as_utc_index(times)
+    # Position solaire et ciel clair calculés une seule fois pour toutes les façades
+    solar_position = get_solar_position_series(times=times, lat=lat, long=long, altitude=altitude)
+    azimuth = solar_position['azimuth'].values
+    elevation = solar_position['elevation'].values
+    dni, dhi, ghi = get_clear_sky_rad_series(times=times, lat=lat, long=long, altitude=altitude,
+                                             solar_position=solar_position)
+    corrected_dni = calculate_real_irradiance(dni=dni, cloud_percentage=np.asarray(cloud_percentage, dtype=float))
+    irr_pvlib = get_irr_vertical_surfaces(dni=corrected_dni, dhi=dhi, ghi=ghi, facades_azimuth=facades_azimuth,
+                                          solar_zenith=solar_position['apparent_zenith'].values,
+                                          solar_azimuth=azimuth, rho=rho)
+    irr_trigo = irradiance_trigo_array(dni=corrected_dni[:, np.newaxis],
+                                       dhi=dhi[:, np.newaxis],
+                                       ghi=ghi[:, np.newaxis],
+                                       solar_angle=elevation[:, np.newaxis],
+                                       solar_azimuth=azimuth[:, np.newaxis],
+                                       facade_azimuth=np.asarray(facades_azimuth, dtype=float)[np.newaxis, :],
+                                       angle_condition=angle_condition,
+                                       rho=rho)
+    surfaces = np.asarray(windows_surface, dtype=float)[np.newaxis, :]
+    apports_pvlib = facteur_solaire * irr_pvlib * surfaces
+    apports_trigo = facteur_solaire * irr_trigo * surfaces
+    apports = (apports_pvlib + apports_trigo) / 2
+    return apports, solar_position, (dni, dhi, ghi), corrected_dni
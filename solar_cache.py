@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+
+# -------------------------------------------------------------------------
+# Cache LRU des calculs solaires : clés (kind, lat, long, altitude, time bucket)
+# -------------------------------------------------------------------------
+class SolarCache:
+    def __init__(self, maxsize=4096, time_bucket=None):
+        self.maxsize = maxsize  # Nombre maximal d'entrées conservées avant éviction (LRU)
+        self.time_bucket = time_bucket  # Ex: "5min" pour regrouper les instants proches, None = instant exact
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._locations = {}
+
+    # -------- TIME BUCKET (UTC, COMME LE RESTE DU CALCUL) --------
+    def bucket(self, today):
+        import pandas as pd
+
+        timestamp = pd.Timestamp(today)
+        if timestamp.tz is None:
+            timestamp = timestamp.tz_localize('UTC')
+        if self.time_bucket is not None:
+            timestamp = timestamp.floor(self.time_bucket)
+        return timestamp
+
+    def key(self, kind, lat, long, altitude, today):
+        return kind, float(lat), float(long), altitude, self.bucket(today)
+
+    # -------- LRU --------
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    # -------- UNE SEULE LOCATION PVLIB PAR SITE --------
+    def location(self, lat, long, altitude=None):
+        import pvlib
+
+        site = (float(lat), float(long), altitude)
+        if site not in self._locations:
+            self._locations[site] = pvlib.location.Location(lat, long, altitude=altitude)
+        return self._locations[site]
+
+    # -------- TURBIDITE DE LINKE (FICHIER H5) : UNE LECTURE PAR SITE ET PAR JOUR --------
+    def linke_turbidity(self, lat, long, today):
+        import pandas as pd
+        import pvlib
+
+        day = self.bucket(today).normalize()
+        key = ("linke", float(lat), float(long), None, day)
+        return self.get_or_compute(key, lambda: pvlib.clearsky.lookup_linke_turbidity(
+            pd.DatetimeIndex([day]), lat, long).values[0])
+
+    def clear(self):
+        self._entries.clear()
+        self._locations.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+SOLAR_CACHE = SolarCache()  # Cache partagé par défaut
@@ -0,0 +1,90 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+import main
+from batch import boiler_from_building, building_from_constants, load_manifest, select_building, solar_kwargs
+from radiator import RadiateurFleet
+from replay import COLONNES, iter_weather_chunks
+
+COLONNES_CHARGE = {**COLONNES, "charge": "charge"}  # La charge cible [W] s'ajoute aux colonnes météo
+
+
+# -------------------------------------------------------------------------
+# Résolution inverse : température de départ (ou déplacement parallèle de la loi d'eau) pour laquelle
+#   puissance radiateurs + apports solaires = charge cible
+# La puissance des radiateurs est linéaire en T entree (P = a * T + b) et la loi d'eau est linéaire en T ext :
+# les solutions sont exactes et calculées en une passe sur tous les instants, sans recherche itérative.
+# -------------------------------------------------------------------------
+def solve_balance(boiler, fleets, charge, apports_solaires, temperature_ext):
+    # Coefficients cumulés de tous les circuits : P radiateurs = a * T entree + b
+    a = 0.0
+    b = 0.0
+    for radiateurs in fleets:
+        a_circuit, b_circuit = radiateurs.coefficients_puissance()
+        a += a_circuit
+        b += b_circuit
+    if a <= 0:
+        raise ValueError("Aucun radiateur dans le(s) circuit(s) du bâtiment : température de départ indéterminée")
+    puissance_radiateurs = np.asarray(charge, dtype=float) - np.asarray(apports_solaires, dtype=float)
+    t_depart = (puissance_radiateurs - b) / a
+    return {"puissance_radiateurs_requise": puissance_radiateurs,
+            "t_depart_requis": t_depart,
+            "deplacement_requis": boiler.calculer_deplacement(temperature_ext, t_depart),
+            "t_ext_equilibre": boiler.calculer_t_ext(t_depart),  # T ext pour laquelle la loi d'eau actuelle donne t_depart
+            "atteignable": (t_depart >= boiler.t_min_chaudiere) & (t_depart <= boiler.t_max_chaudiere)}
+
+
+# -------- UN BLOC D'INSTANTS : APPORTS SOLAIRES PUIS RESOLUTION --------
+def solve_chunk(chunk, building, boiler, fleets, colonnes=COLONNES_CHARGE):
+    times = pd.DatetimeIndex(pd.to_datetime(chunk[colonnes["date"]]))
+    temperature = chunk[colonnes["temperature"]].to_numpy(dtype=float)
+    charge = chunk[colonnes["charge"]].to_numpy(dtype=float)
+    apports = main.solar_management_series(
+        times=times, cloud=chunk[colonnes["nuages"]].to_numpy(dtype=float), **solar_kwargs(building))[0]
+    resultats = solve_balance(boiler, fleets, charge=charge, apports_solaires=apports, temperature_ext=temperature)
+    return pd.DataFrame({"date": chunk[colonnes["date"]].to_numpy(),
+                         "temperature": temperature,
+                         "charge": charge,
+                         "apports_solaires": apports,
+                         **resultats})
+
+
+def solve_file(input_path, output_path, building=None, chunksize=8760, colonnes=COLONNES_CHARGE, delimiter=";"):
+    building = building if building is not None else building_from_constants()
+    boiler = boiler_from_building(building)
+    fleets = [RadiateurFleet.from_csv(radiateur["fichier"], t_entree_dim=radiateur["regime"][0],
+                                      t_sortie_dim=radiateur["regime"][1]) for radiateur in building["radiateurs"]]
+    deplacements = []
+    lignes = 0
+    for numero, chunk in enumerate(iter_weather_chunks(input_path, chunksize=chunksize, colonnes=colonnes,
+                                                       delimiter=delimiter)):
+        resultats = solve_chunk(chunk, building, boiler, fleets, colonnes=colonnes)
+        resultats.to_csv(output_path, sep=";", index=False, mode="w" if numero == 0 else "a", header=numero == 0)
+        deplacements.append(resultats["deplacement_requis"].to_numpy()[resultats["atteignable"].to_numpy()])
+        lignes += len(resultats)
+    deplacements = np.concatenate(deplacements) if deplacements else np.empty(0)
+    # Déplacement parallèle unique conseillé : médiane des déplacements requis sur les instants atteignables
+    return {"instants": lignes, "deplacement_actuel": boiler.depla_parallele,
+            "deplacement_conseille": float(np.nanmedian(deplacements)) if len(deplacements) else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("entree", help="Fichier (.csv ou .parquet) : colonnes date, temperature, nuages, charge [W]")
+    parser.add_argument("-o", "--output", default="resolution.csv", help="Résultats par instant (.csv)")
+    parser.add_argument("--chunksize", type=int, default=8760, help="Nombre d'instants traités par bloc")
+    parser.add_argument("--manifest", default=None, help="Manifeste JSON (voir batch.py), défaut : constantes de main.py")
+    parser.add_argument("--batiment", default=None, help="Nom du bâtiment du manifeste (défaut : le premier)")
+    parser.add_argument("--colonnes", type=json.loads, default=COLONNES_CHARGE, help="Correspondance des colonnes (JSON)")
+    args = parser.parse_args()
+    building = None
+    if args.manifest is not None:
+        building = select_building(load_manifest(args.manifest), nom=args.batiment)
+    synthese = solve_file(args.entree, args.output, building=building, chunksize=args.chunksize,
+                          colonnes={**COLONNES_CHARGE, **args.colonnes})
+    print(f"Déplacement parallèle actuel : {synthese['deplacement_actuel']:.2f} °C")
+    if synthese["deplacement_conseille"] is not None:
+        print(f"Déplacement parallèle conseillé : {synthese['deplacement_conseille']:.2f} °C -> {args.output}")